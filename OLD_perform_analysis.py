@@ -1,10 +1,13 @@
-from transformers import pipeline
 import re
 import pandas as pd
 import numpy as np
 from tqdm import tqdm
 import ast
 from nltk.corpus import stopwords
+from project_data import load_project_data
+from model_registry import registry, get_pipeline
+from chunking import get_chunker
+from translation_cache import TranslationCache, TRANSLATION_CACHE_FILE
 
 
 def preprocess_text(text, translation_model):
@@ -22,32 +25,50 @@ def preprocess_text(text, translation_model):
     return text
 
 
-def translate_text(text, translation_model, max_token_length=512):
+def translate_chunks(chunks, translation_model, max_token_length, batch_size=None, cache=None):
+    """
+    Translations of chunks, in order. Chunks found in the cache (a TranslationCache) are
+    not translated again, and the others are translated once each and added to it.
+    """
+    # The int8 ONNX models translate slightly differently, so their translations are cached apart.
+    cache_model = translation_model if registry.backend == "pytorch" else f"{translation_model}@{registry.backend}"
+    translations = cache.get_many(cache_model, chunks) if cache is not None else {}
+    missing = list(dict.fromkeys(chunk for chunk in chunks if chunk not in translations))
+    if missing:
+        translation_pipeline = get_pipeline("translation", translation_model)
+        if batch_size:
+            outputs = run_batched(translation_pipeline, missing, batch_size, max_length=max_token_length)
+        else:
+            outputs = [translation_pipeline(chunk, max_length=max_token_length)[0] for chunk in missing]
+        new_translations = {chunk: output['translation_text'] for chunk, output in zip(missing, outputs)}
+        if cache is not None:
+            cache.put_many(cache_model, new_translations)
+        translations.update(new_translations)
+    return [translations[chunk] for chunk in chunks]
+
+
+def translate_text(text, translation_model, max_token_length=512, cache=None):
     """
     Translate French text to English using Hugging Face transformers.
-    Handles long text by splitting it into smaller chunks.
+    Handles long text by splitting it into chunks of sentences of at most max_token_length tokens.
     """
-    translation_pipeline = pipeline("translation", model=translation_model)
-
-    text_chunks = [text[i:i + max_token_length] for i in range(0, len(text), max_token_length)]
-    translated_chunks = []
-    for chunk in text_chunks:
-        translation = translation_pipeline(chunk, max_length=max_token_length)[0]['translation_text']
-        translated_chunks.append(translation)
+    text_chunks = get_chunker("translation", translation_model, max_token_length).chunk(text)
+    translated_chunks = translate_chunks(text_chunks, translation_model, max_token_length, cache=cache)
 
     return ' '.join(translated_chunks)
 
 
 
 
-def huggingface_analysis(text, task_type, model, max_token_length):
+def huggingface_analysis(text, task_type, model, max_token_length, overlap=0):
     """
     Perform analysis using Hugging Face transformers.
-    Handles long texts by splitting them into smaller chunks if needed.
+    Handles long texts by splitting them into chunks of sentences of at most max_token_length tokens,
+    consecutive chunks sharing up to `overlap` tokens of context.
     """
-    analysis_pipeline = pipeline(task_type, model=model)
+    analysis_pipeline = get_pipeline(task_type, model)
 
-    text_chunks = [text[i:i + max_token_length] for i in range(0, len(text), max_token_length)]
+    text_chunks = get_chunker(task_type, model, max_token_length, overlap).chunk(text)
     results = []
     for chunk in text_chunks:
         result = analysis_pipeline(chunk)
@@ -75,7 +96,8 @@ def aggregate_results(results, task_type):
     return {"label": None, "score": 0}
 
 
-def perform_nlp_analysis(text, task_type, model, max_token_length, translation_model=None):
+def perform_nlp_analysis(text, task_type, model, max_token_length, translation_model=None, overlap=0,
+                         translation_cache=None):
     """
     Combine TextBlob and Hugging Face transformer-based analysis.
     Supports optional translation from French to English.
@@ -83,12 +105,13 @@ def perform_nlp_analysis(text, task_type, model, max_token_length, translation_m
     preprocessed_text = preprocess_text(text, translation_model)
     translated_text = preprocessed_text 
     if translation_model:
-        translated_text = translate_text(preprocessed_text, translation_model, max_token_length)
-    huggingface_result = huggingface_analysis(translated_text, task_type, model, max_token_length)
+        translated_text = translate_text(preprocessed_text, translation_model, max_token_length, translation_cache)
+    huggingface_result = huggingface_analysis(translated_text, task_type, model, max_token_length, overlap)
     return translated_text, huggingface_result
 
 
-def create_nlp_features(df, task_type, model, max_token_length, text_columns, translation_model=None):
+def create_nlp_features(df, task_type, model, max_token_length, text_columns, translation_model=None,
+                        translation_cache=None):
     """
     Create NLP features for each text column in the DataFrame and store translated text.
     """
@@ -98,7 +121,8 @@ def create_nlp_features(df, task_type, model, max_token_length, text_columns, tr
 
         for row in tqdm(range(df.shape[0])):
             text = df.loc[row, col]
-            translated_text, analysis_results = perform_nlp_analysis(text, task_type, model, max_token_length, translation_model)
+            translated_text, analysis_results = perform_nlp_analysis(text, task_type, model, max_token_length, translation_model,
+                                                                     translation_cache=translation_cache)
             translated_texts.append(translated_text)
             sentiment_labels.append(analysis_results['label'])
         df[f'{col}_translated'] = translated_texts
@@ -106,12 +130,70 @@ def create_nlp_features(df, task_type, model, max_token_length, text_columns, tr
     return df
 
 
+def run_batched(analysis_pipeline, chunks, batch_size, **kwargs):
+    """
+    Run the pipeline on all chunks in batches of batch_size and return the outputs in the
+    order of chunks. Chunks are sorted by length first, so each batch holds chunks of
+    similar length and little padding is wasted.
+    """
+    order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+    outputs = [None] * len(chunks)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        results = analysis_pipeline([chunks[i] for i in batch], batch_size=batch_size, **kwargs)
+        for i, result in zip(batch, results):
+            outputs[i] = result[0] if isinstance(result, list) else result
+    return outputs
+
+
+def split_chunks(texts, chunker):
+    """
+    Chunks of every text, flattened, with the index of the text each chunk comes from.
+    """
+    chunks, owners = [], []
+    for owner, text in enumerate(texts):
+        for chunk in chunker.chunk(text):
+            chunks.append(chunk)
+            owners.append(owner)
+    return chunks, owners
+
+
+def create_nlp_features_batched(df, task_type, model, max_token_length, text_columns, translation_model=None,
+                                batch_size=16, overlap=0, translation_cache=None):
+    """
+    Same features as create_nlp_features, but the chunks of all rows go through the
+    translation and analysis pipelines together, in batches of batch_size. The results
+    are gathered back per row and aggregated with aggregate_results. Missing texts get
+    no translation and no label.
+    """
+    for col in text_columns:
+        rows = [row for row in range(df.shape[0]) if not pd.isna(df.loc[row, col])]
+        texts = [preprocess_text(df.loc[row, col], translation_model) for row in rows]
+
+        if translation_model:
+            chunks, owners = split_chunks(texts, get_chunker("translation", translation_model, max_token_length))
+            translations = translate_chunks(chunks, translation_model, max_token_length, batch_size, translation_cache)
+            translated_chunks = [[] for _ in texts]
+            for owner, translation in zip(owners, translations):
+                translated_chunks[owner].append(translation)
+            texts = [' '.join(parts) for parts in translated_chunks]
+
+        analysis_pipeline = get_pipeline(task_type, model)
+        chunks, owners = split_chunks(texts, get_chunker(task_type, model, max_token_length, overlap))
+        results = [[] for _ in texts]
+        for owner, result in zip(owners, run_batched(analysis_pipeline, chunks, batch_size)):
+            results[owner].append(result)
+
+        translated_texts = [None] * df.shape[0]
+        sentiment_labels = [None] * df.shape[0]
+        for row, translated_text, row_results in zip(rows, texts, results):
+            translated_texts[row] = translated_text
+            if row_results:
+                sentiment_labels[row] = aggregate_results(row_results, task_type)['label']
+        df[f'{col}_translated'] = translated_texts
+        df[f'{col}_sentiment_label'] = sentiment_labels
+    return df
 
-try:
-    df = pd.read_csv('project_data.csv', sep=';', encoding='utf-8', on_bad_lines='skip')
-except pd.errors.ParserError as e:
-    print(f"Error while parsing the file: {e}")
-    exit(1)
 
 task_type_sentiment = 'sentiment-analysis'
 model_sentiment = 'nlptown/bert-base-multilingual-uncased-sentiment'
@@ -122,7 +204,45 @@ translation_model = 'Helsinki-NLP/opus-mt-fr-en'
 text_generation_model = ""
 max_token_length = 512
 text_columns = ['A propos', 'Project Description']
-# df = create_nlp_features(df.sample(10, random_state=42).reset_index(drop=True), task_type_sentiment, model_sentiment, max_token_length, text_columns, translation_model)
-df_nlp = create_nlp_features(df, task_type_classification, model_classification, max_token_length, text_columns, translation_model)
-df_nlp.to_csv('project_data_class_eng.csv', index=False, sep=';', decimal='.', encoding='utf-8')
-print("NLP features with translation added and saved to 'project_data_class_eng.csv'")
+
+
+def main(warmup=True, memory_budget_mb=None, batch_size=16, translation_cache_file=TRANSLATION_CACHE_FILE,
+         translation_cache_max_entries=None, backend="pytorch", threads=None):
+    """
+    Translate and classify the project texts. The models are loaded once through the
+    model registry (and warmed up before the first row when warmup is True), with at
+    most memory_budget_mb of model weights kept in memory if set.
+    With backend="onnx", they run as int8 ONNX Runtime models on `threads` CPU threads
+    (see onnx_backend.py) instead of PyTorch.
+    The chunks of all rows are processed in batches of batch_size, or one by one per
+    row with batch_size=None.
+    Translated chunks are kept in translation_cache_file, so only chunks never seen
+    before are translated. Pass translation_cache_file=None to translate everything.
+    """
+    df = load_project_data(columns=['file_name', *text_columns])
+
+    registry.memory_budget_mb = memory_budget_mb
+    registry.set_backend(backend, threads)
+    translation_cache = None
+    if translation_cache_file is not None:
+        translation_cache = TranslationCache(translation_cache_file, max_entries=translation_cache_max_entries)
+    if warmup:
+        registry.warmup([("translation", translation_model), (task_type_classification, model_classification)])
+
+    # df = create_nlp_features(df.sample(10, random_state=42).reset_index(drop=True), task_type_sentiment, model_sentiment, max_token_length, text_columns, translation_model)
+    if batch_size:
+        df_nlp = create_nlp_features_batched(df, task_type_classification, model_classification, max_token_length,
+                                             text_columns, translation_model, batch_size=batch_size,
+                                             translation_cache=translation_cache)
+    else:
+        df_nlp = create_nlp_features(df, task_type_classification, model_classification, max_token_length, text_columns, translation_model,
+                                     translation_cache=translation_cache)
+    df_nlp.to_csv('project_data_class_eng.csv', index=False, sep=';', decimal='.', encoding='utf-8')
+    print("NLP features with translation added and saved to 'project_data_class_eng.csv'")
+    print(f"Model registry: {registry.stats}")
+    if translation_cache is not None:
+        print(f"Translation cache: {translation_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
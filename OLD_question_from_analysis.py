@@ -1,12 +1,13 @@
-from transformers import pipeline
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
+from model_registry import registry, get_pipeline
 
 def generate_responses(text, qa_model, questions):
     """
     Generate responses to a set of predefined questions using a QA model.
     """
-    qa_pipeline = pipeline("question-answering", model=qa_model)
+    qa_pipeline = get_pipeline("question-answering", qa_model)
     
     responses = {}
     for question in questions:
@@ -42,6 +43,53 @@ def create_question_based_features(df, text_columns, qa_model, questions):
     return df
 
 
+def answer_pairs(qa_pipeline, pairs, batch_size):
+    """
+    Answers to a list of (question, context) pairs, asked to the pipeline in one batched call.
+    If the batch fails, its pairs are asked one by one so only the failing ones get "Error".
+    """
+    try:
+        results = qa_pipeline(question=[question for question, _ in pairs], context=[context for _, context in pairs],
+                              batch_size=batch_size)
+        results = [results] if isinstance(results, dict) else results
+        return [result['answer'] for result in results]
+    except Exception:
+        answers = []
+        for question, context in pairs:
+            try:
+                answers.append(qa_pipeline(question=question, context=context)['answer'])
+            except Exception:
+                answers.append("Error")
+        return answers
+
+
+def create_question_based_features_batched(df, text_columns, qa_model, questions, batch_size=32):
+    """
+    Same features as create_question_based_features, with every (row, question) pair of a
+    column sent through the QA pipeline as one workload, in batches of batch_size.
+    Rows are ordered by context length so each batch pads little, and the answers are
+    written into preallocated arrays that become the answer columns at the end.
+    """
+    qa_pipeline = get_pipeline("question-answering", qa_model)
+    for col in text_columns:
+        contexts = df[col].tolist()
+        answers = {question: np.full(len(contexts), '', dtype=object) for question in questions}
+        rows = [row for row, text in enumerate(contexts) if not (pd.isna(text) or text.strip() == '')]
+        rows.sort(key=lambda row: len(contexts[row]))
+
+        pairs = [(row, question) for row in rows for question in questions]
+        for start in tqdm(range(0, len(pairs), batch_size)):
+            batch = pairs[start:start + batch_size]
+            batch_answers = answer_pairs(qa_pipeline, [(question, contexts[row]) for row, question in batch], batch_size)
+            for (row, question), answer in zip(batch, batch_answers):
+                answers[question][row] = answer
+
+        for question in questions:
+            df[f"{col}_answer_{question.replace(' ', '_').replace('?', '')}"] = answers[question]
+
+    return df
+
+
 questions = [
         "What is the core objective or mission of this project?",
         "What resources (financial, human, or technological) are required for the successful execution of this project?",
@@ -57,12 +105,30 @@ qa_model = "deepset/roberta-base-squad2"
 # max_token_length = 1028
 # max_answer_length = 256
 
-df = pd.read_csv('project_data_class_eng.csv', sep=';', encoding='utf-8', on_bad_lines='skip')
-print(f"Loaded DataFrame with shape: {df.shape}")
-
 text_columns = ['A propos_translated']
-df_with_responses = create_question_based_features(df, text_columns, qa_model, questions)
-df_with_responses.to_csv('project_data_with_responses.csv', index=False, sep=';', decimal='.', encoding='utf-8')
-print("New question-based features added and saved to 'project_data_with_responses.csv'")
 
 
+def main(warmup=True, batch_size=32, backend="pytorch", threads=None):
+    """
+    Answer the questions for every project. All (row, question) pairs go through the QA
+    model in batches of batch_size, or one pipeline call per question and row with batch_size=None.
+    With backend="onnx", the QA model runs as an int8 ONNX Runtime model on `threads` CPU threads.
+    """
+    df = pd.read_csv('project_data_class_eng.csv', sep=';', encoding='utf-8', on_bad_lines='skip')
+    print(f"Loaded DataFrame with shape: {df.shape}")
+
+    registry.set_backend(backend, threads)
+    if warmup:
+        registry.warmup([("question-answering", qa_model)])
+
+    if batch_size:
+        df_with_responses = create_question_based_features_batched(df, text_columns, qa_model, questions, batch_size)
+    else:
+        df_with_responses = create_question_based_features(df, text_columns, qa_model, questions)
+    df_with_responses.to_csv('project_data_with_responses.csv', index=False, sep=';', decimal='.', encoding='utf-8')
+    print("New question-based features added and saved to 'project_data_with_responses.csv'")
+    print(f"Model registry: {registry.stats}")
+
+
+if __name__ == "__main__":
+    main()
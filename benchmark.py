@@ -0,0 +1,534 @@
+import os
+import re
+import sys
+import json
+import random
+import platform
+import tempfile
+import threading
+import time
+import timeit
+import difflib
+from collections import Counter
+import psutil
+from get_data_from_text import (get_files, remove_spaces, extract_quantitative_data, extract_text_from_folder,
+                                iter_records, normalize_units)
+from project_data import build_typed_frame, save_project_data
+import perform_analysis_llm
+from perform_analysis_llm import preprocess_text, analyze_row
+from llm_client import LLMClient
+from mock_llm_server import start_mock_llm_server
+from http_fetcher import create_session, discover_project_urls, fetch_projects
+from pipeline import run_pipeline
+from fixtures import generate_page, generate_corpus
+from mock_pretup_server import start_mock_server, SESSION_COOKIE
+
+
+def legacy_extract_quantitative_data(text):
+    """
+    Reference copy of the original extract_quantitative_data, kept to check the compiled scanner against.
+    """
+    quantitative_data = {}
+
+    patterns = {
+        "Project Name": r"Projets à financer\s*\|\s*(.*)",
+        "Category of Activity": r"Partager ce projet\s*:\s*([\w\s-]+)\s+-",
+        "Location": r"- ([\w\s'-]+)\s+\((\d{2})\)",
+        "Project Description": r"\|\s*([^|]+)\n",
+        "Montant remboursé": r"([\d\s,.]+)\s*€\s*/\s*([\d\s,.]+)\s*€",
+        "Taux d’intérêt annuel": r"TAUX PAR AN\s*([\d,.]+)\s*%",
+        "Niveau de risque": r"NIVEAU DE RISQUE\*\s*([A-D]+.?)",
+        "Durée": r"DURÉE\s*(\d+)\s*(mois|ans)",
+        "Durée de financement": r"FINANCÉ EN\s*([\d\s,.]+)\s*(heures|minutes|jours)",
+        "Chiffre d'affaires": r"Chiffre d'affaires\s*\((\d{4})\)\s*:\s*([\d\s,.]+)\s*€",
+        "Date de création": r"Date de création\s*:\s*(\d{4})",
+        "Nombre de salariés": r"Nombre de salariés\s*:\s*(\d+)",
+        "Nombre de preteurs": r"([\d\s]+)\s+prêteurs",
+    }
+
+    for key, pattern in patterns.items():
+        match = re.search(pattern, text)
+        if match:
+            if key == "Montant remboursé":
+                quantitative_data["Montant Levé"] = match.group(1).replace(" ", "").replace(",", ".")
+                quantitative_data["Montant Demandé"] = match.group(2).replace(" ", "").replace(",", ".")
+            elif key == "Taux d’intérêt annuel":
+                quantitative_data[key] = float(match.group(1).replace(",", ".")) / 100
+            elif key == "Durée" or key == "Durée de financement":
+                quantitative_data[key + " (value)"] = match.group(1).replace(" ", "")
+                quantitative_data[key + " (unit)"] = match.group(2)
+            elif key == "Location":
+                quantitative_data["City"] = match.group(1).strip()
+                quantitative_data["Department"] = match.group(2)
+            elif key == "Project Name":
+                quantitative_data[key] = match.group(1).strip()
+            elif key == "Project Description":
+                quantitative_data[key] = match.group(1).strip().split("\n")[4]
+            elif key == "Chiffre d'affaires":
+                quantitative_data[key + " (year)"] = match.group(1)
+                quantitative_data[key + " (value)"] = match.group(2).replace(" ", "").replace(",", ".")
+            elif key == "Date de création":
+                quantitative_data[key] = int(match.group(1))
+            elif key == "Nombre de salariés":
+                quantitative_data[key] = int(match.group(1).replace(" ", "").replace(",", "."))
+            elif key == "Nombre de preteurs":
+                quantitative_data[key] = int(match.group(1).replace(" ", "").replace(",", "."))
+            else:
+                quantitative_data[key] = match.group(1).strip()
+
+    return quantitative_data
+
+
+def run_extractor(extractor, text):
+    try:
+        result = extractor(text)
+        return result, list(result)
+    except Exception as e:
+        return type(e).__name__
+
+
+def load_texts(folder_txt):
+    texts = []
+    for data_file in get_files(folder_txt):
+        with open(data_file, 'r', encoding='utf-8') as f:
+            texts.append(remove_spaces(f.read()))
+    return texts
+
+
+def check_extraction_parity(texts):
+    """
+    Compare extract_quantitative_data with the legacy implementation on every text.
+    Values, column order and raised exceptions must all be identical.
+    """
+    mismatches = []
+    for i, text in enumerate(texts):
+        if run_extractor(extract_quantitative_data, text) != run_extractor(legacy_extract_quantitative_data, text):
+            mismatches.append(i)
+    return mismatches
+
+
+def assert_extraction_parity(texts):
+    mismatches = check_extraction_parity(texts)
+    print(f"Parity: {len(texts) - len(mismatches)}/{len(texts)} pages identical")
+    for i in mismatches[:10]:
+        print(f"Mismatch on page {i}")
+    if mismatches:
+        raise AssertionError(f"extract_quantitative_data differs from the legacy extractor on {len(mismatches)} pages")
+
+
+def check_parity(n_pages=2000, seed=0):
+    """
+    Fail unless extract_quantitative_data matches the legacy extractor on a generated corpus.
+    Quick enough to run on every change of QUANTITATIVE_FIELDS or search_field.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        folder_txt = os.path.join(tmp_dir, "project_txt_files")
+        generate_corpus(folder_txt, n_pages, seed=seed)
+        assert_extraction_parity(load_texts(folder_txt))
+
+
+def bench_extraction(texts, repeat=5):
+    results = {}
+    for name, extractor in [("legacy", legacy_extract_quantitative_data), ("compiled", extract_quantitative_data)]:
+        timer = timeit.Timer(lambda: [run_extractor(extractor, text) for text in texts])
+        seconds = min(timer.repeat(repeat=repeat, number=1))
+        results[name] = len(texts) / seconds
+    return results
+
+
+def bench_llm_client(n_requests=64, latency=0.1, slots=4, in_flight=(1, 4, 8)):
+    """
+    Rows per second of the LLM analysis against the stub chat completions server,
+    for each max_in_flight setting of the client.
+    """
+    server, url = start_mock_llm_server(latency=latency, slots=slots)
+    rnd = random.Random(0)
+    jobs = [((i, 'A propos'), (i, preprocess_text(generate_page(i, rnd)), '{}')) for i in range(n_requests)]
+    results = {}
+    try:
+        for max_in_flight in in_flight:
+            client = LLMClient(url, max_in_flight=max_in_flight)
+            start = time.perf_counter()
+            answers = dict(client.map(lambda job: analyze_row(job, client), jobs))
+            results[max_in_flight] = n_requests / (time.perf_counter() - start)
+            client.close()
+            if sorted(answers) != [key for key, _ in jobs] or any(result is None or result[0] == "Error"
+                                                                  for result in answers.values()):
+                raise RuntimeError(f"Missing or failed answers with max_in_flight={max_in_flight}")
+    finally:
+        server.shutdown()
+    return results
+
+
+class PeakRSS:
+    """
+    Sample the resident memory of the process every `interval` seconds while active and
+    keep the highest value, in MB.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def sample(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+    @property
+    def peak_mb(self):
+        return self.peak / 1024 ** 2
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def format_value(value, spec):
+    return format(value, spec) if value is not None else "n/a"
+
+
+def to_ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def summarize(name, unit, items, seconds, latencies, peak_rss):
+    """
+    One benchmark result: items processed per second over the whole run, p50/p99 of the
+    per-call latencies in milliseconds (None when no call was timed) and peak resident memory in MB.
+    """
+    return {
+        'name': name,
+        'unit': unit,
+        'items': items,
+        'seconds': round(seconds, 4),
+        'throughput_per_s': round(items / seconds, 2) if seconds else None,
+        'latency_p50_ms': to_ms(percentile(latencies, 50)),
+        'latency_p99_ms': to_ms(percentile(latencies, 99)),
+        'peak_rss_mb': round(peak_rss.peak_mb, 1),
+    }
+
+
+def timed_calls(function, inputs):
+    latencies = []
+    for item in inputs:
+        start = time.perf_counter()
+        function(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_extract_text_from_folder(folder_txt, repeat=5):
+    n_pages = len(get_files(folder_txt))
+    with PeakRSS() as peak_rss:
+        latencies = timed_calls(lambda _: extract_text_from_folder(folder_txt), range(repeat))
+    return summarize("extract_text_from_folder", "pages", n_pages * repeat, sum(latencies),
+                     [latency / n_pages for latency in latencies], peak_rss)
+
+
+def bench_normalize_units(folder_txt, repeat=20):
+    data = extract_text_from_folder(folder_txt)
+    with PeakRSS() as peak_rss:
+        latencies = timed_calls(lambda _: normalize_units(data.copy()), range(repeat))
+    return summarize("normalize_units", "rows", len(data) * repeat, sum(latencies),
+                     [latency / len(data) for latency in latencies], peak_rss)
+
+
+def bench_preprocess_text(texts, repeat=5):
+    texts = texts * repeat
+    with PeakRSS() as peak_rss:
+        latencies = timed_calls(preprocess_text, texts)
+    return summarize("preprocess_text", "texts", len(texts), sum(latencies), latencies, peak_rss)
+
+
+def bench_llm_end_to_end(folder_txt, tmp_dir, max_in_flight=4, latency=0.05, slots=4, compact=False):
+    """
+    perform_analysis_llm.main on the extracted corpus against the stub chat completions server.
+    Latencies are per LLM request.
+    """
+    input_file = os.path.join(tmp_dir, "project_data.parquet")
+    save_project_data(build_typed_frame(list(iter_records(folder_txt))), input_file)
+    checkpoint_file = os.path.join(tmp_dir, f"llm_results_{compact}.jsonl")
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+    server, url = start_mock_llm_server(latency=latency, slots=slots)
+    client = LLMClient(url, max_in_flight=max_in_flight)
+    latencies = []
+    chat = client.chat
+
+    def timed_chat(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return chat(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    client.chat = timed_chat
+    try:
+        with PeakRSS() as peak_rss:
+            start = time.perf_counter()
+            perform_analysis_llm.main(input_file=input_file, output_file=os.path.join(tmp_dir, "df_augmented.csv"),
+                                      client=client, cache_file=None, checkpoint_file=checkpoint_file, compact=compact)
+            seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    name = "llm_analysis_compact" if compact else "llm_analysis"
+    return summarize(name, "rows", len(latencies), seconds, latencies, peak_rss)
+
+
+def bench_scrape_end_to_end(tmp_dir, n_projects=300, latency=0.02, workers=16, requests_per_second=200):
+    """
+    HTTP discovery and fetch of every project of the mock Pretup site. Latencies are per page fetch.
+    """
+    server, base_url = start_mock_server(n_projects=n_projects, latency=latency)
+    name, value = SESSION_COOKIE.split("=")
+    session = create_session([{'name': name, 'value': value}], pool_size=workers)
+    latencies = []
+    get = session.get
+
+    def timed_get(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return get(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        with PeakRSS() as peak_rss:
+            start = time.perf_counter()
+            project_urls = discover_project_urls(session, base_url, f"{base_url}projets-a-financer?page={{page}}",
+                                                 workers=8)
+            session.get = timed_get
+            n_fetched = fetch_projects(session, project_urls, os.path.join(tmp_dir, "fetched"), workers=workers,
+                                       requests_per_second=requests_per_second, skip_existing=False)
+            seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    return summarize("scrape_http", "pages", n_fetched, seconds, latencies, peak_rss)
+
+
+def bench_pipeline_end_to_end(tmp_dir, n_projects=300, latency=0.02, workers=16, requests_per_second=200,
+                              max_in_flight=4, llm_latency=0.05, slots=4):
+    """
+    Streaming fetch, extraction and LLM analysis of every project of the mock Pretup site
+    against the stub chat completions server. Latencies are per LLM request.
+    """
+    server, base_url = start_mock_server(n_projects=n_projects, latency=latency)
+    llm_server, url = start_mock_llm_server(latency=llm_latency, slots=slots)
+    name, value = SESSION_COOKIE.split("=")
+    session = create_session([{'name': name, 'value': value}], pool_size=workers)
+    client = LLMClient(url, max_in_flight=max_in_flight)
+    latencies = []
+    chat = client.chat
+
+    def timed_chat(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return chat(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    client.chat = timed_chat
+    pipeline_dir = os.path.join(tmp_dir, "pipeline")
+    os.makedirs(pipeline_dir, exist_ok=True)
+    try:
+        with PeakRSS() as peak_rss:
+            start = time.perf_counter()
+            project_urls = discover_project_urls(session, base_url, f"{base_url}projets-a-financer?page={{page}}",
+                                                 workers=8)
+            df = run_pipeline(session, project_urls, os.path.join(pipeline_dir, "project_txt_files"),
+                              fetch_workers=workers, requests_per_second=requests_per_second, client=client,
+                              manifest_path=os.path.join(pipeline_dir, "extraction_manifest.db"),
+                              csv_file=os.path.join(pipeline_dir, "project_data.csv"),
+                              parquet_file=os.path.join(pipeline_dir, "project_data.parquet"),
+                              output_file=os.path.join(pipeline_dir, "df_augmented.csv"), cache_file=None,
+                              checkpoint_file=os.path.join(pipeline_dir, "llm_results.jsonl"))
+            seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        llm_server.shutdown()
+    return summarize("pipeline", "projects", len(df), seconds, latencies, peak_rss)
+
+
+# Minimum agreement between the int8 ONNX and the PyTorch outputs: mean similarity of the
+# translations, share of identical classification labels and mean token F1 of the QA answers.
+PARITY_THRESHOLDS = {'translation': 0.9, 'text-classification': 0.95, 'question-answering': 0.9}
+
+
+def token_f1(answer, reference):
+    answer, reference = answer.lower().split(), reference.lower().split()
+    if not answer or not reference:
+        return float(answer == reference)
+    common = sum((Counter(answer) & Counter(reference)).values())
+    if common == 0:
+        return 0.0
+    precision, recall = common / len(answer), common / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+
+def run_backend(backend, texts, english_texts=None, threads=None, batch_size=16):
+    """
+    Outputs and throughput (items/s) of the translation, classification and QA models with
+    one inference backend. The French texts are translated, and the classification and QA
+    models read english_texts if given (so that both backends get the same inputs), or else
+    the translations.
+    """
+    from model_registry import ModelRegistry, load_backend
+    from OLD_perform_analysis import translation_model, task_type_classification, model_classification, max_token_length
+    from OLD_question_from_analysis import qa_model, questions
+    registry = ModelRegistry(loader=load_backend(backend, threads))
+    registry.warmup([("translation", translation_model), (task_type_classification, model_classification),
+                     ("question-answering", qa_model)])
+    outputs = {}
+    items_per_second = {}
+
+    start = time.perf_counter()
+    translations = registry.get("translation", translation_model)(texts, max_length=max_token_length, batch_size=batch_size)
+    items_per_second['translation'] = len(texts) / (time.perf_counter() - start)
+    outputs['translation'] = [output['translation_text'] for output in translations]
+    english_texts = english_texts or outputs['translation']
+
+    start = time.perf_counter()
+    outputs['text-classification'] = registry.get(task_type_classification, model_classification)(
+        english_texts, batch_size=batch_size, truncation=True)
+    items_per_second['text-classification'] = len(english_texts) / (time.perf_counter() - start)
+
+    pairs = [(question, context) for context in english_texts for question in questions]
+    start = time.perf_counter()
+    answers = registry.get("question-answering", qa_model)(
+        question=[question for question, _ in pairs], context=[context for _, context in pairs], batch_size=batch_size)
+    items_per_second['question-answering'] = len(pairs) / (time.perf_counter() - start)
+    outputs['question-answering'] = [answer['answer'] for answer in answers]
+    return outputs, items_per_second, registry.memory_mb()
+
+
+def compare_backends(texts, n_texts=32, threads=None, batch_size=16):
+    """
+    Accuracy parity and speed of the int8 ONNX Runtime backend against the PyTorch pipelines
+    on the first n_texts French texts. The models are downloaded and exported on first use.
+    """
+    texts = texts[:n_texts]
+    reference, reference_speed, reference_mb = run_backend("pytorch", texts, threads=threads, batch_size=batch_size)
+    outputs, speed, onnx_mb = run_backend("onnx", texts, reference['translation'], threads, batch_size)
+
+    agreement = {
+        'translation': sum(difflib.SequenceMatcher(None, output, expected).ratio()
+                           for output, expected in zip(outputs['translation'], reference['translation'])) / len(texts),
+        'text-classification': sum(output['label'] == expected['label']
+                                   for output, expected in zip(outputs['text-classification'],
+                                                               reference['text-classification'])) / len(texts),
+        'question-answering': sum(token_f1(output, expected)
+                                  for output, expected in zip(outputs['question-answering'],
+                                                              reference['question-answering']))
+                              / len(reference['question-answering']),
+    }
+    results = {
+        task: {
+            'pytorch_items_per_s': round(reference_speed[task], 2),
+            'onnx_items_per_s': round(speed[task], 2),
+            'speedup': round(speed[task] / reference_speed[task], 2),
+            'agreement': round(agreement[task], 4),
+            'parity': agreement[task] >= PARITY_THRESHOLDS[task],
+        }
+        for task in PARITY_THRESHOLDS
+    }
+    results['weights_mb'] = {'pytorch': round(reference_mb, 1), 'onnx': round(onnx_mb, 1)}
+    return results
+
+
+def run_suite(folder_txt, tmp_dir):
+    texts = [text for text in build_typed_frame(list(iter_records(folder_txt)))['A propos'].dropna()]
+    return [
+        bench_extract_text_from_folder(folder_txt),
+        bench_normalize_units(folder_txt),
+        bench_preprocess_text(texts),
+        bench_llm_end_to_end(folder_txt, tmp_dir),
+        bench_llm_end_to_end(folder_txt, tmp_dir, compact=True),
+        bench_scrape_end_to_end(tmp_dir),
+        bench_pipeline_end_to_end(tmp_dir),
+    ]
+
+
+def main(folder_txt="project_txt_files", n_pages=2000, output_file="benchmark_results.json", suite=True,
+         backends=False, threads=None):
+    """
+    Check the extraction parity and benchmark it against the legacy regex loop, then run the
+    benchmark suite (extraction, unit normalization, text preprocessing and the end-to-end
+    LLM analysis, scraping and streaming pipeline against the local stub servers) and write
+    the results to output_file as JSON. With suite=False, the report has no suite benchmarks.
+    With backends=True, also compare the int8 ONNX Runtime backend of the Hugging Face models,
+    on `threads` CPU threads, with the PyTorch one (this downloads the models).
+    """
+    backend_results = None
+    suite_results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if not os.path.isdir(folder_txt):
+            folder_txt = os.path.join(tmp_dir, "project_txt_files")
+            generate_corpus(folder_txt, n_pages)
+        texts = load_texts(folder_txt)
+        # Checked first: the benchmarks below are meaningless if the extraction changed.
+        assert_extraction_parity(texts)
+        if suite:
+            suite_results = run_suite(folder_txt, tmp_dir)
+        if backends:
+            about_texts = list(build_typed_frame(list(iter_records(folder_txt)))['A propos'].dropna())
+            backend_results = compare_backends(about_texts, threads=threads)
+
+    results = bench_extraction(texts)
+    for name, pages_per_second in results.items():
+        print(f"{name}: {pages_per_second:.0f} pages/s")
+    print(f"Speedup: {results['compiled'] / results['legacy']:.2f}x")
+
+    llm_results = bench_llm_client()
+    for max_in_flight, rows_per_second in llm_results.items():
+        print(f"LLM analysis, {max_in_flight} in flight: {rows_per_second:.1f} rows/s")
+
+    if backend_results is not None:
+        for task in PARITY_THRESHOLDS:
+            result = backend_results[task]
+            print(f"{task:<20} PyTorch {result['pytorch_items_per_s']:.1f}/s, ONNX int8 {result['onnx_items_per_s']:.1f}/s "
+                  f"({result['speedup']:.2f}x), agreement {result['agreement']:.3f} "
+                  f"{'OK' if result['parity'] else 'BELOW THRESHOLD'}")
+        print(f"Model weights (MB): {backend_results['weights_mb']}")
+
+    for result in suite_results:
+        print(f"{result['name']:<26} {format_value(result['throughput_per_s'], '.1f'):>10} {result['unit']}/s  "
+              f"p50={format_value(result['latency_p50_ms'], '.3f')}ms "
+              f"p99={format_value(result['latency_p99_ms'], '.3f')}ms  "
+              f"peak RSS={result['peak_rss_mb']:.0f}MB")
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'n_pages': len(texts),
+        'extraction_parity': True,
+        'extraction_pages_per_s': results,
+        'llm_rows_per_s_by_in_flight': llm_results,
+        'backends': backend_results,
+        'benchmarks': suite_results,
+    }
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to '{output_file}'")
+
+
+if __name__ == "__main__":
+    main()
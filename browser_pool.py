@@ -0,0 +1,125 @@
+import os
+import queue
+import threading
+import time
+from selenium.webdriver.common.by import By
+from http_fetcher import project_saved, save_project_text
+from pacing import navigate
+from metrics import metrics
+
+
+def start_logged_in_driver(create_driver, cookies, website_url):
+    """
+    Start a browser and inject the cookies of the session that logged in, so the worker does not log in again.
+    """
+    driver = create_driver()
+    try:
+        driver.get(website_url)
+        for cookie in cookies:
+            cookie = {key: value for key, value in cookie.items() if key != 'sameSite'}
+            driver.add_cookie(cookie)
+    except Exception:
+        driver.quit()
+        raise
+    return driver
+
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def browser_worker(worker_id, url_queue, create_driver, cookies, website_url, output_dir, create_rate_limiter, timer,
+                   max_attempts, crawl_state, skip_existing, counts, counts_lock, corpus_store):
+    driver = None
+    # One limiter per browser, so a slow or crashing browser only slows itself down.
+    rate_limiter = create_rate_limiter() if create_rate_limiter is not None else None
+    while True:
+        url = url_queue.get()
+        if url is None:
+            break
+
+        if skip_existing and project_saved(url, output_dir, corpus_store):
+            print(f"[worker {worker_id}] Already saved {url}, skipping...")
+            continue
+
+        for attempt in range(1, max_attempts + 1):
+            try:
+                if driver is None:
+                    driver = start_logged_in_driver(create_driver, cookies, website_url)
+                navigate(driver, url, rate_limiter, timer)
+                project_text = driver.find_element(By.CSS_SELECTOR, "body").text
+                file_path = save_project_text(url, project_text, output_dir, corpus_store)
+                print(f"[worker {worker_id}] Successfully scraped and saved {url} to {file_path}")
+                if crawl_state is not None:
+                    crawl_state.mark_fetched(url, project_text)
+                with counts_lock:
+                    counts['scraped'] += 1
+                metrics.incr("pages_scraped", status="ok")
+                break
+            except Exception as e:
+                error = e
+                # Whatever went wrong, the browser may be dead or stuck on a broken page:
+                # restart it before the next attempt instead of failing the whole run.
+                print(f"[worker {worker_id}] Attempt {attempt}/{max_attempts} failed for {url}: {e}")
+                if driver is not None:
+                    quit_driver(driver)
+                    driver = None
+                    with counts_lock:
+                        counts['restarts'] += 1
+                    metrics.incr("browser_restarts")
+        else:
+            if crawl_state is not None:
+                crawl_state.mark_failed(url, error)
+            with counts_lock:
+                counts['failed'] += 1
+            metrics.incr("pages_scraped", status="failed")
+
+    if driver is not None:
+        quit_driver(driver)
+
+
+def scrape_with_browser_pool(project_urls, create_driver, cookies, website_url, output_dir="project_txt_files",
+                             workers=4, create_rate_limiter=None, timer=None, max_attempts=3, crawl_state=None,
+                             skip_existing=True, corpus_store=None):
+    """
+    Scrape the project pages with `workers` browsers taking urls from a shared queue,
+    each paced by its own rate limiter from create_rate_limiter(), when given. The texts go
+    to project_{id}.txt files in output_dir, or to corpus_store when one is given.
+    Every browser reuses the cookies of the logged-in session and is restarted on its own
+    if it crashes. Projects already saved are skipped unless skip_existing
+    is False. Results are recorded in crawl_state when one is given.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    url_queue = queue.Queue()
+    for url in project_urls:
+        if skip_existing and project_saved(url, output_dir, corpus_store):
+            print(f"Project {url.split('-')[-1]} already saved, skipping...")
+        else:
+            url_queue.put(url)
+    for _ in range(workers):
+        url_queue.put(None)
+
+    counts = {'scraped': 0, 'failed': 0, 'restarts': 0}
+    counts_lock = threading.Lock()
+    threads = [
+        threading.Thread(
+            target=browser_worker,
+            args=(worker_id, url_queue, create_driver, cookies, website_url, output_dir, create_rate_limiter, timer,
+                  max_attempts, crawl_state, skip_existing, counts, counts_lock, corpus_store),
+            daemon=True,
+        )
+        for worker_id in range(workers)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    print(f"Scraped {counts['scraped']} pages in {elapsed:.1f}s with {workers} browsers "
+          f"({counts['failed']} failed, {counts['restarts']} browser restarts)")
+    return counts
@@ -0,0 +1,94 @@
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from model_registry import get_pipeline
+
+
+SENTENCE_END_PATTERN = re.compile(r'(?<=[.!?;])\s+')
+
+
+def split_sentences(text):
+    return [sentence for sentence in SENTENCE_END_PATTERN.split(text) if sentence]
+
+
+class Chunker:
+    """
+    Split texts into chunks of whole sentences holding at most max_tokens tokens of the
+    model's tokenizer, special tokens included. Consecutive chunks share up to `overlap`
+    tokens of trailing sentences. A sentence longer than a chunk is cut on token boundaries.
+    The chunks of the last cache_size texts are kept, keyed by the hash of the text.
+    """
+
+    def __init__(self, tokenizer, max_tokens=512, overlap=0, cache_size=10000):
+        self.tokenizer = tokenizer
+        self.budget = max_tokens - tokenizer.num_special_tokens_to_add()
+        self.overlap = overlap
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def count_tokens(self, sentences):
+        return [len(ids) for ids in self.tokenizer(sentences, add_special_tokens=False)['input_ids']]
+
+    def split_long_sentence(self, sentence):
+        ids = self.tokenizer(sentence, add_special_tokens=False)['input_ids']
+        return [self.tokenizer.decode(ids[i:i + self.budget]) for i in range(0, len(ids), self.budget)]
+
+    def pack(self, text):
+        sentences = split_sentences(text)
+        if not sentences:
+            return []
+        pieces = []
+        for sentence, n_tokens in zip(sentences, self.count_tokens(sentences)):
+            if n_tokens > self.budget:
+                long_pieces = self.split_long_sentence(sentence)
+                pieces.extend(zip(long_pieces, self.count_tokens(long_pieces)))
+            else:
+                pieces.append((sentence, n_tokens))
+
+        chunks = []
+        current, current_tokens = [], 0
+        for sentence, n_tokens in pieces:
+            # Sentences are joined with a space, which may cost one token.
+            if current and current_tokens + n_tokens + 1 > self.budget:
+                chunks.append(' '.join(sentence for sentence, _ in current))
+                kept, kept_tokens = [], 0
+                for previous in reversed(current):
+                    if kept_tokens + previous[1] + 1 > self.overlap:
+                        break
+                    kept.insert(0, previous)
+                    kept_tokens += previous[1] + 1
+                if kept_tokens + n_tokens + 1 > self.budget:
+                    kept, kept_tokens = [], 0
+                current, current_tokens = kept, kept_tokens
+            current.append((sentence, n_tokens))
+            current_tokens += n_tokens + (1 if len(current) > 1 else 0)
+        chunks.append(' '.join(sentence for sentence, _ in current))
+        return chunks
+
+    def chunk(self, text):
+        key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        chunks = self.pack(text)
+        with self.lock:
+            self.cache[key] = chunks
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return chunks
+
+
+chunkers = {}
+
+
+def get_chunker(task, model, max_tokens=512, overlap=0):
+    """
+    Shared Chunker using the tokenizer of the (task, model) pipeline of the model registry.
+    """
+    key = (task, model, max_tokens, overlap)
+    if key not in chunkers:
+        chunkers[key] = Chunker(get_pipeline(task, model).tokenizer, max_tokens, overlap)
+    return chunkers[key]
@@ -0,0 +1,204 @@
+import os
+import re
+import mmap
+import time
+import hashlib
+import sqlite3
+import threading
+import pyarrow as pa
+
+
+CORPUS_PACK_FILE = 'corpus.pack'
+PROJECT_FILE_PATTERN = re.compile(r'project_(.+)\.txt$')
+
+
+class CorpusStore:
+    """
+    Append-only store of the scraped page texts.
+
+    Every distinct text is compressed with zstd and appended once to pack_file, so
+    snapshots of a page that did not change take no space. index_file (corpus_index.db
+    next to corpus.pack by default) is a SQLite index of the pack: the offset, length and
+    size of every text by content hash, and the hash of every (project id, fetch time)
+    snapshot. Texts are read through a memory map of
+    the pack. Safe to share between the fetch threads.
+    """
+
+    def __init__(self, pack_file=CORPUS_PACK_FILE, index_file=None, compression_level=9):
+        self.pack_file = pack_file
+        self.codec = pa.Codec('zstd', compression_level=compression_level)
+        if index_file is None:
+            index_file = f"{os.path.splitext(pack_file)[0]}_index.db"
+        self.conn = sqlite3.connect(index_file, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    offset INTEGER,
+                    length INTEGER,
+                    size INTEGER
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    project_id TEXT,
+                    fetched_at REAL,
+                    hash TEXT,
+                    PRIMARY KEY (project_id, fetched_at)
+                )
+            """)
+        self.pack = open(pack_file, 'ab')
+        self.reader = None
+        self.map = None
+
+    def close(self):
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                self.reader.close()
+            self.pack.close()
+            self.conn.close()
+
+    def put(self, project_id, text, fetched_at=None):
+        return self.put_many([(project_id, text, fetched_at)])
+
+    def put_many(self, pages):
+        """
+        Store (project_id, text, fetched_at) snapshots, fetched_at defaulting to now.
+        The pack is synced to disk before the index is committed, so the index never points
+        past the end of the pack. Returns the number of texts that were not stored yet.
+        """
+        with self.lock:
+            blobs = {}
+            snapshots = []
+            for project_id, text, fetched_at in pages:
+                data = text.encode('utf-8')
+                content_hash = hashlib.sha256(data).hexdigest()
+                snapshots.append((str(project_id), fetched_at or time.time(), content_hash))
+                if content_hash in blobs or self.conn.execute(
+                        "SELECT 1 FROM blobs WHERE hash = ?", (content_hash,)).fetchone():
+                    continue
+                compressed = self.codec.compress(data, asbytes=True)
+                self.pack.seek(0, os.SEEK_END)
+                blobs[content_hash] = (self.pack.tell(), len(compressed), len(data))
+                self.pack.write(compressed)
+            if blobs:
+                self.pack.flush()
+                os.fsync(self.pack.fileno())
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO blobs (hash, offset, length, size) VALUES (?, ?, ?, ?)",
+                                      [(content_hash, *blob) for content_hash, blob in blobs.items()])
+                self.conn.executemany("INSERT OR REPLACE INTO snapshots (project_id, fetched_at, hash) VALUES (?, ?, ?)",
+                                      snapshots)
+        return len(blobs)
+
+    def read(self, offset, length, size):
+        with self.lock:
+            if self.map is None or offset + length > len(self.map):
+                # The pack grew since it was mapped.
+                if self.map is not None:
+                    self.map.close()
+                    self.reader.close()
+                self.reader = open(self.pack_file, 'rb')
+                self.map = mmap.mmap(self.reader.fileno(), 0, access=mmap.ACCESS_READ)
+            data = self.map[offset:offset + length]
+        return self.codec.decompress(data, decompressed_size=size, asbytes=True).decode('utf-8')
+
+    def has(self, project_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM snapshots WHERE project_id = ? LIMIT 1", (str(project_id),)).fetchone() is not None
+
+    def get(self, project_id, fetched_at=None):
+        """
+        Text of the latest snapshot of the project, or of the latest one fetched at or
+        before fetched_at. None if there is none.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT offset, length, size FROM snapshots JOIN blobs USING (hash) "
+                "WHERE project_id = ? AND fetched_at <= ? ORDER BY fetched_at DESC LIMIT 1",
+                (str(project_id), fetched_at if fetched_at is not None else float('inf')),
+            ).fetchone()
+        return None if row is None else self.read(*row)
+
+    def snapshots(self, project_id):
+        """
+        (fetched_at, content hash) of every snapshot of the project, oldest first.
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT fetched_at, hash FROM snapshots WHERE project_id = ? ORDER BY fetched_at",
+                (str(project_id),),
+            ).fetchall()
+
+    def latest(self):
+        """
+        (project_id, fetched_at, content hash, offset, length, size) of the latest snapshot
+        of every project, in pack order so that the reads go forward through the file.
+        """
+        with self.lock:
+            return self.conn.execute("""
+                SELECT project_id, fetched_at, hash, offset, length, size
+                FROM snapshots JOIN blobs USING (hash)
+                WHERE (project_id, fetched_at) IN (
+                    SELECT project_id, MAX(fetched_at) FROM snapshots GROUP BY project_id
+                )
+                ORDER BY offset
+            """).fetchall()
+
+    def iter_latest_texts(self):
+        for project_id, fetched_at, content_hash, offset, length, size in self.latest():
+            yield project_id, fetched_at, self.read(offset, length, size)
+
+    def import_folder(self, folder_txt="project_txt_files", batch_size=1000):
+        """
+        Store the project_{id}.txt files of folder_txt, fetched at their mtime.
+        """
+        pages = []
+        imported = 0
+        for file_name in sorted(os.listdir(folder_txt)):
+            match = PROJECT_FILE_PATTERN.match(file_name)
+            if not match:
+                continue
+            file_path = os.path.join(folder_txt, file_name)
+            with open(file_path, 'r', encoding='utf-8') as f:
+                pages.append((match.group(1), f.read(), os.path.getmtime(file_path)))
+            if len(pages) == batch_size:
+                imported += self.put_many(pages)
+                pages = []
+        imported += self.put_many(pages)
+        return imported
+
+    def stats(self):
+        with self.lock:
+            projects, snapshots = self.conn.execute(
+                "SELECT COUNT(DISTINCT project_id), COUNT(*) FROM snapshots").fetchone()
+            blobs, stored_bytes, text_bytes = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {
+            'projects': projects,
+            'snapshots': snapshots,
+            'texts': blobs,
+            'text_mb': text_bytes / 1024 ** 2,
+            'pack_mb': stored_bytes / 1024 ** 2,
+            'compression_ratio': text_bytes / stored_bytes if stored_bytes else 0.0,
+        }
+
+
+def main(folder_txt="project_txt_files", pack_file=CORPUS_PACK_FILE):
+    """
+    Import the project text files of folder_txt into the corpus store.
+    """
+    store = CorpusStore(pack_file)
+    try:
+        imported = store.import_folder(folder_txt)
+        print(f"Imported {imported} new texts from '{folder_txt}' into '{pack_file}'")
+        print(f"Corpus store: {store.stats()}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+
+CRAWL_STATE_FILE = 'crawl_state.db'
+
+
+class CrawlState:
+    """
+    Crawl frontier and url index stored in SQLite.
+
+    Every project url is a row keyed by url with its project id, first-seen and
+    last-fetched times, status ('new', 'fetched' or 'failed'), retry count and the
+    hash of the last fetched text. Each fetch result is committed as soon as it is
+    recorded, so an interrupted run resumes with exactly the urls that are not done.
+    Safe to share between the fetch threads.
+    """
+
+    def __init__(self, file_name=CRAWL_STATE_FILE):
+        self.conn = sqlite3.connect(file_name, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS projects (
+                    url TEXT PRIMARY KEY,
+                    project_id TEXT,
+                    first_seen REAL,
+                    last_fetched REAL,
+                    status TEXT DEFAULT 'new',
+                    retry_count INTEGER DEFAULT 0,
+                    content_hash TEXT,
+                    last_error TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS projects_status ON projects (status, last_fetched)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS projects_project_id ON projects (project_id)")
+
+    def close(self):
+        self.conn.close()
+
+    def add_urls(self, urls):
+        """
+        Register urls, ignoring the ones already known. Returns the new urls.
+        """
+        now = time.time()
+        new_urls = []
+        with self.lock, self.conn:
+            for url in urls:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO projects (url, project_id, first_seen) VALUES (?, ?, ?)",
+                    (url, url.split('-')[-1], now),
+                )
+                if cursor.rowcount:
+                    new_urls.append(url)
+        return new_urls
+
+    def import_url_file(self, file_name='project_urls.txt'):
+        if not os.path.exists(file_name):
+            return []
+        with open(file_name, 'r') as f:
+            return self.add_urls(url for url in f.read().splitlines() if url)
+
+    def mark_existing_files(self, output_dir="project_txt_files"):
+        """
+        Mark the new urls whose project_{id}.txt is already on disk as fetched,
+        e.g. pages scraped before the crawl state existed.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT url, project_id FROM projects WHERE status = 'new'").fetchall()
+        for url, project_id in rows:
+            file_path = os.path.join(output_dir, f"project_{project_id}.txt")
+            if os.path.exists(file_path):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    self.mark_fetched(url, f.read(), fetched_at=os.path.getmtime(file_path))
+
+    def mark_fetched(self, url, text, fetched_at=None):
+        content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE projects SET status = 'fetched', last_fetched = ?, content_hash = ?, last_error = NULL "
+                "WHERE url = ?",
+                (fetched_at or time.time(), content_hash, url),
+            )
+
+    def mark_failed(self, url, error):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE projects SET status = 'failed', retry_count = retry_count + 1, last_error = ? WHERE url = ?",
+                (str(error), url),
+            )
+
+    def pending_urls(self, max_retries=3, refetch_older_than=None):
+        """
+        Urls still to fetch: new ones, failed ones with fewer than max_retries attempts and,
+        if refetch_older_than (seconds) is given, fetched ones older than that.
+        """
+        query = ("SELECT url FROM projects WHERE status = 'new' "
+                 "OR (status = 'failed' AND retry_count < ?)")
+        params = [max_retries]
+        if refetch_older_than is not None:
+            query += " OR (status = 'fetched' AND last_fetched < ?)"
+            params.append(time.time() - refetch_older_than)
+        with self.lock:
+            return [url for url, in self.conn.execute(query + " ORDER BY first_seen, url", params)]
+
+    def urls(self):
+        with self.lock:
+            return [url for url, in self.conn.execute("SELECT url FROM projects ORDER BY first_seen, url")]
+
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM projects GROUP BY status"))
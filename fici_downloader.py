@@ -0,0 +1,118 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from pacing import RateLimiter
+
+
+def fici_file_path(project_url, download_dir="fici_pdf"):
+    return os.path.join(download_dir, f'fici_{project_url.split("/")[-1]}.pdf')
+
+
+def find_fici_link(session, project_url, rate_limiter=None, timeout=30):
+    """
+    Url of the telecharger_fici.php link of a project page, fetched over the session instead of a browser.
+    """
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    start = time.perf_counter()
+    try:
+        response = session.get(project_url, timeout=timeout)
+        response.raise_for_status()
+    except Exception:
+        if rate_limiter is not None:
+            rate_limiter.record(time.perf_counter() - start, ok=False)
+        raise
+    if rate_limiter is not None:
+        rate_limiter.record(time.perf_counter() - start)
+    link = BeautifulSoup(response.content, "lxml").select_one("a[href*='telecharger_fici.php']")
+    if link is None:
+        raise ValueError(f"No FICI link found on {project_url}")
+    return urljoin(response.url, link['href'])
+
+
+def download_file(session, url, file_path, chunk_size=64 * 1024, rate_limiter=None, timeout=60):
+    """
+    Stream url to file_path in chunks. The data goes to file_path + '.part' first and is
+    renamed once complete, so file_path only ever holds complete files. A partial file left
+    by an interrupted download is resumed with an HTTP Range request.
+    Returns the number of bytes written by this call.
+    """
+    part_path = file_path + '.part'
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    start = time.perf_counter()
+    try:
+        response = session.get(url, headers=headers, stream=True, timeout=timeout)
+    except Exception:
+        if rate_limiter is not None:
+            rate_limiter.record(time.perf_counter() - start, ok=False)
+        raise
+    if rate_limiter is not None:
+        # Time to the response headers: the body takes as long as the file is large.
+        rate_limiter.record(time.perf_counter() - start, ok=response.ok or response.status_code == 416)
+    with response:
+        if response.status_code == 416 and offset:
+            # Nothing left to fetch: the partial file already holds the whole document.
+            os.replace(part_path, file_path)
+            return 0
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            offset = 0  # The server ignored the Range header and sent the whole file.
+
+        expected_size = response.headers.get('Content-Length')
+        if response.headers.get('Content-Encoding', 'identity') != 'identity':
+            # Content-Length is the size on the wire, but iter_content yields the decoded bytes.
+            expected_size = None
+        written = 0
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+
+    if expected_size is not None and written != int(expected_size):
+        raise IOError(f"Incomplete download of {url}: {written}/{expected_size} bytes, will resume on next run")
+    os.replace(part_path, file_path)
+    return written
+
+
+def download_ficis(session, project_urls, download_dir="fici_pdf", workers=4, requests_per_second=4,
+                  slow_threshold=10):
+    """
+    Download the FICI of every project with at most `workers` downloads in flight, under a
+    rate limit of requests_per_second (None for no limit) that backs off on failed or slow
+    (> slow_threshold seconds to the response headers) requests.
+    Complete files are skipped and partial ones resumed.
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    pending = [url for url in project_urls if not os.path.exists(fici_file_path(url, download_dir))]
+    print(f"{len(pending)} FICI to download, {len(project_urls) - len(pending)} already complete")
+    rate_limiter = None
+    if requests_per_second:
+        rate_limiter = RateLimiter(requests_per_second, burst=workers, slow_threshold=slow_threshold)
+
+    def download_project_fici(project_url):
+        try:
+            fici_link = find_fici_link(session, project_url, rate_limiter)
+            file_path = fici_file_path(project_url, download_dir)
+            written = download_file(session, fici_link, file_path, rate_limiter=rate_limiter)
+            print(f"Successfully downloaded to: {file_path}")
+            return written
+        except Exception as e:
+            print(f"Failed to download FICI from {project_url}: {e}")
+            return None
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(download_project_fici, pending))
+    elapsed = time.monotonic() - start
+
+    downloaded = [written for written in results if written is not None]
+    if pending:
+        print(f"Downloaded {len(downloaded)}/{len(pending)} FICI, {sum(downloaded) / 1e6:.1f} MB "
+              f"in {elapsed:.1f}s ({sum(downloaded) / 1e6 / max(elapsed, 1e-9):.1f} MB/s)")
+    return len(downloaded)
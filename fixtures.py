@@ -0,0 +1,74 @@
+import os
+import random
+
+
+CATEGORIES = ["Boulangerie", "Transport et logistique", "Hôtellerie - restauration", "BTP", "Services aux entreprises"]
+CITIES = ["Paris", "Lyon", "Saint-Jean d'Angély", "Aix en Provence", "Nantes"]
+RISKS = ["A", "A+", "B", "B+", "C", "C-", "D"]
+ABOUT_SENTENCES = [
+    "Fondée il y a plusieurs années, l'entreprise s'est imposée comme un acteur reconnu de son secteur.",
+    "Le dirigeant dispose d'une solide expérience et s'appuie sur une équipe fidèle et qualifiée.",
+    "La société souhaite financer l'acquisition de nouveaux équipements afin d'augmenter sa capacité de production.",
+    "Son chiffre d'affaires progresse chaque année grâce à une clientèle diversifiée de professionnels et de particuliers.",
+    "Le projet permettra également de recruter deux salariés supplémentaires d'ici la fin de l'année.",
+    "L'entreprise dispose d'un carnet de commandes bien rempli pour les douze prochains mois.",
+    "Elle se distingue par la qualité de ses prestations et par sa réactivité.",
+    "Le marché local reste porteur malgré un contexte économique incertain.",
+]
+
+
+def generate_page(project_id, rnd, missing_rate=0.1):
+    """
+    Generate the body text of a Pretup project page, as saved by main.scrape_project_text.
+    Each optional field is left out with probability missing_rate.
+    """
+    def present():
+        return rnd.random() >= missing_rate
+
+    lines = [
+        "Accueil",
+        "Projets à financer | Projet %d" % project_id,
+        "Menu",
+        "Mon compte",
+    ]
+    if present():
+        lines.append("Partager ce projet : %s - %s (%02d)" % (
+            rnd.choice(CATEGORIES), rnd.choice(CITIES), rnd.randint(1, 95)))
+    lines += ["Présentation du projet %d, ligne %d du texte" % (project_id, i) for i in range(rnd.randint(5, 9))]
+    if present():
+        lines.append("%s € / %s €" % (
+            rnd.choice(["12 500", "1 234,50", "48 000", "100 000"]), rnd.choice(["50 000", "100 000", "250 000"])))
+    if present():
+        lines += ["TAUX PAR AN", "%s %%" % rnd.choice(["5", "5,5", "7,25", "9"])]
+    if present():
+        lines += ["NIVEAU DE RISQUE*", rnd.choice(RISKS)]
+    if present():
+        lines += ["DURÉE", "%d %s" % (rnd.randint(6, 60), rnd.choice(["mois", "ans"]))]
+    if present():
+        lines += ["FINANCÉ EN", "%s %s" % (rnd.randint(1, 48), rnd.choice(["heures", "minutes", "jours"]))]
+    if present():
+        lines.append("Financé par %s prêteurs" % rnd.choice(["87", "1 234", "2 051"]))
+    if present():
+        lines.append("Chiffre d'affaires (%d) : %s €" % (rnd.randint(2015, 2023), rnd.choice(["350 000", "1 200 000"])))
+    if present():
+        lines.append("Date de création : %d" % rnd.randint(1980, 2022))
+    if present():
+        lines.append("Nombre de salariés : %d" % rnd.randint(0, 250))
+    if present():
+        lines += ["A propos de", "Société %d" % project_id, ""]
+        lines += ["  %s  " % " ".join(rnd.sample(ABOUT_SENTENCES, rnd.randint(2, 5))) for _ in range(rnd.randint(1, 6))]
+        lines.append("Gouvernance")
+    lines += ["Mentions légales", "Contact"]
+    return "\n\n".join(lines) + "\n"
+
+
+def generate_corpus(folder, n_pages, seed=0, missing_rate=0.1):
+    """
+    Write n_pages synthetic project_{id}.txt files into folder.
+    """
+    rnd = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    for project_id in range(n_pages):
+        file_path = os.path.join(folder, f"project_{project_id}.txt")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(generate_page(project_id, rnd, missing_rate))
@@ -1,7 +1,19 @@
 import os
 import re
+import json
+import hashlib
+import sqlite3
+import tempfile
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
+from metrics import metrics
+from corpus_store import CorpusStore
+from project_data import (
+    PROJECT_DATA_FILE, build_typed_frame, open_project_data_writer, write_project_data_chunk, save_project_data,
+)
 
 def get_files(directory):
     files = []
@@ -10,67 +22,122 @@ def get_files(directory):
             files.append(os.path.join(root, file))
     return files
 
+# Bump when the extraction logic changes so that cached records are re-parsed.
+EXTRACTOR_VERSION = 1
+
+SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s]')
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n')
+ABOUT_PATTERN = re.compile(r"A propos de(.*?)(?:Gouvernance|Dirigeants)", re.DOTALL)
+
 def remove_special_chars(text):
-    return re.sub(r'[^\w\s]', '', text)
+    return SPECIAL_CHARS_PATTERN.sub('', text)
 
 def remove_spaces(text):
-    return re.sub(r'\n\s*\n', '\n', text)
+    return BLANK_LINES_PATTERN.sub('\n', text)
+
+def remove_blanks(value):
+    return value.replace(" ", "")
+
+def to_amount(value):
+    return remove_blanks(value).replace(",", ".")
+
+def to_count(value):
+    return int(to_amount(value))
+
+def to_rate(value):
+    return float(value.replace(",", ".")) / 100
+
+def to_description(value):
+    return value.strip().split("\n", 5)[4]
+
+def is_digit_or_space(char):
+    return char.isdecimal() or char.isspace()
+
+def is_amount_char(char):
+    return char.isdecimal() or char.isspace() or char in ",."
+
+# Declarative spec of the quantitative fields, in output column order:
+# (pattern, anchor, lead, outputs), with outputs a list of (column, group, converter).
+# Every match of a pattern contains its anchor literal, and only characters
+# accepted by lead can precede the anchor inside a match, so the search can
+# jump to the first anchor and step back over those characters instead of
+# trying the pattern at every position of the page.
+QUANTITATIVE_FIELDS = [
+    (r"Projets à financer\s*\|\s*(.*)", "Projets à financer", None,
+     [("Project Name", 1, str.strip)]),
+    (r"Partager ce projet\s*:\s*([\w\s-]+)\s+-", "Partager ce projet", None,
+     [("Category of Activity", 1, str.strip)]),
+    (r"- ([\w\s'-]+)\s+\((\d{2})\)", "- ", None,
+     [("City", 1, str.strip), ("Department", 2, None)]),
+    (r"\|\s*([^|]+)\n", "|", None,
+     [("Project Description", 1, to_description)]),
+    (r"([\d\s,.]+)\s*€\s*/\s*([\d\s,.]+)\s*€", "€", is_amount_char,
+     [("Montant Levé", 1, to_amount), ("Montant Demandé", 2, to_amount)]),
+    (r"TAUX PAR AN\s*([\d,.]+)\s*%", "TAUX PAR AN", None,
+     [("Taux d’intérêt annuel", 1, to_rate)]),
+    (r"NIVEAU DE RISQUE\*\s*([A-D]+.?)", "NIVEAU DE RISQUE*", None,
+     [("Niveau de risque", 1, str.strip)]),
+    (r"DURÉE\s*(\d+)\s*(mois|ans)", "DURÉE", None,
+     [("Durée (value)", 1, remove_blanks), ("Durée (unit)", 2, None)]),
+    (r"FINANCÉ EN\s*([\d\s,.]+)\s*(heures|minutes|jours)", "FINANCÉ EN", None,
+     [("Durée de financement (value)", 1, remove_blanks), ("Durée de financement (unit)", 2, None)]),
+    (r"Chiffre d'affaires\s*\((\d{4})\)\s*:\s*([\d\s,.]+)\s*€", "Chiffre d'affaires", None,
+     [("Chiffre d'affaires (year)", 1, None), ("Chiffre d'affaires (value)", 2, to_amount)]),
+    (r"Date de création\s*:\s*(\d{4})", "Date de création", None,
+     [("Date de création", 1, int)]),
+    (r"Nombre de salariés\s*:\s*(\d+)", "Nombre de salariés", None,
+     [("Nombre de salariés", 1, to_count)]),
+    (r"([\d\s]+)\s+prêteurs", "prêteurs", is_digit_or_space,
+     [("Nombre de preteurs", 1, to_count)]),
+]
+
+COMPILED_QUANTITATIVE_FIELDS = [
+    (re.compile(pattern), anchor, lead, outputs) for pattern, anchor, lead, outputs in QUANTITATIVE_FIELDS
+]
+
+def search_field(pattern, anchor, lead, text):
+    start = text.find(anchor)
+    if start == -1:
+        return None
+    if lead is not None:
+        while start > 0 and lead(text[start - 1]):
+            start -= 1
+    return pattern.search(text, start)
+
+FIELD_NAMES = [outputs[0][0] for _, _, _, outputs in QUANTITATIVE_FIELDS]
 
 def extract_quantitative_data(text):
+    if metrics.enabled:
+        return extract_quantitative_data_timed(text)
     quantitative_data = {}
 
-    patterns = {
-        "Project Name": r"Projets à financer\s*\|\s*(.*)",
-        "Category of Activity": r"Partager ce projet\s*:\s*([\w\s-]+)\s+-",
-        "Location": r"- ([\w\s'-]+)\s+\((\d{2})\)",
-        "Project Description": r"\|\s*([^|]+)\n",
-        "Montant remboursé": r"([\d\s,.]+)\s*€\s*/\s*([\d\s,.]+)\s*€",
-        "Taux d’intérêt annuel": r"TAUX PAR AN\s*([\d,.]+)\s*%",
-        "Niveau de risque": r"NIVEAU DE RISQUE\*\s*([A-D]+.?)",
-        "Durée": r"DURÉE\s*(\d+)\s*(mois|ans)",
-        "Durée de financement": r"FINANCÉ EN\s*([\d\s,.]+)\s*(heures|minutes|jours)",
-        "Chiffre d'affaires": r"Chiffre d'affaires\s*\((\d{4})\)\s*:\s*([\d\s,.]+)\s*€",
-        "Date de création": r"Date de création\s*:\s*(\d{4})",
-        "Nombre de salariés": r"Nombre de salariés\s*:\s*(\d+)",
-        "Nombre de preteurs": r"([\d\s]+)\s+prêteurs",
-    }
-
-    for key, pattern in patterns.items():
-        match = re.search(pattern, text)
+    for pattern, anchor, lead, outputs in COMPILED_QUANTITATIVE_FIELDS:
+        match = search_field(pattern, anchor, lead, text)
         if match:
-            if key == "Montant remboursé":
-                quantitative_data["Montant Levé"] = match.group(1).replace(" ", "").replace(",", ".")
-                quantitative_data["Montant Demandé"] = match.group(2).replace(" ", "").replace(",", ".")
-            elif key == "Taux d’intérêt annuel":
-                quantitative_data[key] = float(match.group(1).replace(",", ".")) / 100
-            elif key == "Durée" or key == "Durée de financement":
-                quantitative_data[key + " (value)"] = match.group(1).replace(" ", "")
-                quantitative_data[key + " (unit)"] = match.group(2)
-            elif key == "Location":
-                quantitative_data["City"] = match.group(1).strip()
-                quantitative_data["Department"] = match.group(2)
-            elif key == "Project Name":
-                quantitative_data[key] = match.group(1).strip()
-            elif key == "Project Description":
-                quantitative_data[key] = match.group(1).strip().split("\n")[4]
-            elif key == "Chiffre d'affaires":
-                quantitative_data[key + " (year)"] = match.group(1)
-                quantitative_data[key + " (value)"] = match.group(2).replace(" ", "").replace(",", ".")
-            elif key == "Date de création":
-                quantitative_data[key] = int(match.group(1))
-            elif key == "Nombre de salariés":
-                quantitative_data[key] = int(match.group(1).replace(" ", "").replace(",", "."))
-            elif key == "Nombre de preteurs":
-                quantitative_data[key] = int(match.group(1).replace(" ", "").replace(",", "."))
-            else:
-                quantitative_data[key] = match.group(1).strip()
+            for column, group, converter in outputs:
+                value = match.group(group)
+                quantitative_data[column] = converter(value) if converter else value
+
+    return quantitative_data
+
+def extract_quantitative_data_timed(text):
+    # Same as extract_quantitative_data, recording the time spent on each field.
+    quantitative_data = {}
+
+    for field, (pattern, anchor, lead, outputs) in zip(FIELD_NAMES, COMPILED_QUANTITATIVE_FIELDS):
+        with metrics.timer("regex_field_seconds", field=field):
+            match = search_field(pattern, anchor, lead, text)
+            if match:
+                for column, group, converter in outputs:
+                    value = match.group(group)
+                    quantitative_data[column] = converter(value) if converter else value
 
     return quantitative_data
 
 def extract_qualitative_data(text):
     qualitative_data = {}
 
-    about_match = re.search(r"A propos de(.*?)(?:Gouvernance|Dirigeants)", text, re.DOTALL)
+    about_match = ABOUT_PATTERN.search(text)
     if about_match:
         about_lines = about_match.group(1).strip().split("\n")
         qualitative_data["Entreprise"] = about_lines[0].strip()
@@ -86,34 +153,201 @@ def convert_columns_to_numeric(df):
             pass
     return df
 
-def extract_text_from_folder(folder_txt, limit=None):
+def extract_file(data_file):
+    with open(data_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return extract_text(text, data_file)
+
+def extract_text(text, data_file):
+    metrics.incr("pages_extracted")
+    text = remove_spaces(text)
+
+    quantitative_data = extract_quantitative_data(text)
+    qualitative_data = extract_qualitative_data(text)
+
+    combined_data = {**quantitative_data, **qualitative_data}
+    combined_data['file_name'] = os.path.basename(data_file)
+    return combined_data
+
+def extract_files(files, workers=1, tasks_per_chunk=64):
+    if workers > 1:
+        # Pages are parsed independently, so they are shipped to the pool in
+        # chunks of file paths and come back as plain dicts, in file order.
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from tqdm(executor.map(extract_file, files, chunksize=tasks_per_chunk), total=len(files))
+        return
+    for data_file in tqdm(files):
+        yield extract_file(data_file)
+
+def open_manifest(manifest_path):
+    conn = sqlite3.connect(manifest_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            hash TEXT,
+            version INTEGER,
+            record TEXT
+        )
+    """)
+    return conn
+
+def hash_file(data_file):
+    with open(data_file, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def store_record(conn, data_file, record, stat=None, file_hash=None):
+    if stat is None:
+        stat = os.stat(data_file)
+        stat = (stat.st_size, stat.st_mtime_ns)
+    conn.execute(
+        "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, version, record) VALUES (?, ?, ?, ?, ?, ?)",
+        (data_file, *stat, file_hash or hash_file(data_file), EXTRACTOR_VERSION, json.dumps(record, ensure_ascii=False)),
+    )
+
+MANIFEST_COMMIT_EVERY = 1000
+
+def iter_manifest_records(conn, paths, changed, records, store):
+    # Walks paths in order: a changed path takes the next parsed record, which is stored
+    # and yielded straight away, the others are read back from the manifest. Nothing is
+    # kept in memory, and the new records are committed every MANIFEST_COMMIT_EVERY pages
+    # so that an interrupted run keeps most of its work.
+    changed = set(changed)
+    pending = 0
+    try:
+        for path in paths:
+            if path in changed:
+                record = next(records)
+                store(path, record)
+                pending += 1
+                if pending == MANIFEST_COMMIT_EVERY:
+                    conn.commit()
+                    pending = 0
+                yield record
+            else:
+                row = conn.execute("SELECT record FROM files WHERE path = ?", (path,)).fetchone()
+                yield json.loads(row[0])
+    finally:
+        conn.commit()
+
+def iter_records_incremental(files, manifest_path, workers=1, tasks_per_chunk=64, prune=True):
+    # The manifest keeps size, mtime and content hash of every parsed file next
+    # to its extracted record. Files whose size and mtime are unchanged are
+    # trusted as is, touched files are re-hashed, and only new or modified
+    # content goes through the regex extraction again.
+    conn = open_manifest(manifest_path)
+    try:
+        known = {
+            path: (size, mtime_ns, file_hash, version)
+            for path, size, mtime_ns, file_hash, version
+            in conn.execute("SELECT path, size, mtime_ns, hash, version FROM files")
+        }
+        stats = {}
+        changed = []
+        with conn:
+            for data_file in files:
+                stat = os.stat(data_file)
+                stats[data_file] = (stat.st_size, stat.st_mtime_ns)
+                entry = known.get(data_file)
+                if entry is None or entry[3] != EXTRACTOR_VERSION:
+                    changed.append(data_file)
+                elif entry[:2] != stats[data_file]:
+                    if hash_file(data_file) == entry[2]:
+                        conn.execute(
+                            "UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                            (*stats[data_file], data_file),
+                        )
+                    else:
+                        changed.append(data_file)
+
+            if prune:
+                conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in known.keys() - stats.keys()])
+
+        print(f"{len(changed)} new or modified files, {len(files) - len(changed)} unchanged")
+        yield from iter_manifest_records(
+            conn, files, changed, extract_files(changed, workers, tasks_per_chunk),
+            lambda data_file, record: store_record(conn, data_file, record, stats[data_file]),
+        )
+    finally:
+        conn.close()
+
+def extract_page(page):
+    return extract_text(*page)
+
+def extract_pages(pages, total, workers=1, tasks_per_chunk=64):
+    # Same as extract_files, for (text, file name) pairs read from the corpus store.
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from tqdm(executor.map(extract_page, pages, chunksize=tasks_per_chunk), total=total)
+        return
+    for page in tqdm(pages, total=total):
+        yield extract_page(page)
+
+def iter_store_records(corpus_store, limit=None, workers=1, tasks_per_chunk=64, manifest_path=None, prune=True):
+    # The latest snapshot of every project is read from the pack in file order, under the
+    # name of its project_{id}.txt file. The manifest is keyed by pack and project id,
+    # and only snapshots whose content hash changed since the last run are parsed again.
+    entries = corpus_store.latest()
+    if limit:
+        entries = entries[:limit]
+
+    def pages(entries):
+        for project_id, _, _, offset, length, size in entries:
+            yield corpus_store.read(offset, length, size), f"project_{project_id}.txt"
+
+    if not manifest_path:
+        yield from extract_pages(pages(entries), len(entries), workers, tasks_per_chunk)
+        return
+
+    conn = open_manifest(manifest_path)
+    try:
+        paths = [f"{corpus_store.pack_file}:{entry[0]}" for entry in entries]
+        known = {path: (file_hash, version) for path, file_hash, version in conn.execute("SELECT path, hash, version FROM files")}
+        changed = [
+            (path, entry) for path, entry in zip(paths, entries)
+            if known.get(path) != (entry[2], EXTRACTOR_VERSION)
+        ]
+        print(f"{len(changed)} new or modified pages, {len(entries) - len(changed)} unchanged")
+        if prune:
+            with conn:
+                conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in known.keys() - set(paths)])
+
+        changed_entries = dict(changed)
+
+        def store(path, record):
+            _, fetched_at, content_hash, _, _, size = changed_entries[path]
+            store_record(conn, path, record, stat=(size, int(fetched_at * 1e9)), file_hash=content_hash)
+
+        records = extract_pages(pages([entry for _, entry in changed]), len(changed), workers, tasks_per_chunk)
+        yield from iter_manifest_records(conn, paths, changed_entries, records, store)
+    finally:
+        conn.close()
+
+def iter_records(folder_txt, limit=None, workers=1, tasks_per_chunk=64, manifest_path=None, corpus_store=None):
+    if corpus_store is not None:
+        yield from iter_store_records(corpus_store, limit, workers, tasks_per_chunk, manifest_path, prune=not limit)
+        return
     files = get_files(folder_txt)
     if limit:
         files = files[:limit]
-    data = []
-    
-    for data_file in tqdm(files):
-        with open(data_file, 'r', encoding='utf-8') as f:
-            text = f.read()
-
-        text = remove_spaces(text)
-
-        quantitative_data = extract_quantitative_data(text)
-        qualitative_data = extract_qualitative_data(text)
-        
-        combined_data = {**quantitative_data, **qualitative_data}
-        combined_data['file_name'] = os.path.basename(data_file)
-        data.append(combined_data)
-        df = pd.DataFrame(data).reset_index()
-        df['Niveau de risque'] = df['Niveau de risque'].fillna('NC')
-        df = df.fillna('N/A')
-        df = convert_columns_to_numeric(df)
+    if manifest_path:
+        yield from iter_records_incremental(files, manifest_path, workers, tasks_per_chunk, prune=not limit)
+    else:
+        yield from extract_files(files, workers, tasks_per_chunk)
+
+def finalize_frame(data):
+    df = pd.DataFrame(data).reset_index()
+    df['Niveau de risque'] = df['Niveau de risque'].fillna('NC')
+    df = df.fillna('N/A')
+    df = convert_columns_to_numeric(df)
     return df
 
-def main():
-    folder_txt = "project_txt_files"
-    data = extract_text_from_folder(folder_txt, limit=None)
-    
+def extract_text_from_folder(folder_txt, limit=None, workers=1, manifest_path=None):
+    data = list(iter_records(folder_txt, limit=limit, workers=workers, manifest_path=manifest_path))
+    return finalize_frame(data)
+
+def normalize_units(data):
     data.loc[data['Durée (unit)'].isna(),'Durée (unit)'] = 'mois'
     data.loc[data['Durée (value)'].isna(),'Durée (value)'].fillna(0, inplace=True)
     data['Durée (value)'] = data['Durée (value)'].replace('N/A', 0)
@@ -131,12 +365,119 @@ def main():
     data.loc[data['Durée de financement (unit)'] == 'minutes', 'Durée de financement (value)'] *= 1
     data.loc[data['Durée de financement (unit)'] == 'heures', 'Durée de financement (value)'] *= 60
     data = data.drop(columns=['Durée de financement (unit)'])
-    
+
     data = data.drop(columns=['index'])
+    return data
+
+def chunked(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def stream_text_to_csv(folder_txt, file_name, limit=None, chunk_size=1000, workers=1, manifest_path=None, parquet_file=None,
+                       corpus_store=None):
+    # First pass: spool the records to disk and record, for every column, what
+    # the full-corpus DataFrame would have looked like (column order, missing
+    # values, numeric dtype). Second pass: rebuild the frame chunk by chunk with
+    # those global properties so the csv matches the in-memory path exactly.
+    columns = {'index': {'count': 0, 'types': set(), 'numeric': True, 'dtype': None}}
+    n_rows = 0
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+        records = iter_records(folder_txt, limit=limit, workers=workers, manifest_path=manifest_path,
+                               corpus_store=corpus_store)
+        for chunk in chunked(records, chunk_size):
+            chunk_columns = {}
+            for record in chunk:
+                spool.write(json.dumps(record, ensure_ascii=False) + '\n')
+                for key, value in record.items():
+                    chunk_columns.setdefault(key, []).append(value)
+            chunk_columns['index'] = list(range(n_rows, n_rows + len(chunk)))
+            n_rows += len(chunk)
+
+            for key, values in chunk_columns.items():
+                column = columns.setdefault(key, {'count': 0, 'types': set(), 'numeric': True, 'dtype': None})
+                if column['count'] < n_rows - len(chunk) or len(values) < len(chunk):
+                    column['numeric'] = False
+                if column['numeric']:
+                    try:
+                        dtype = pd.to_numeric(pd.Series(values)).dtype
+                        column['dtype'] = dtype if column['dtype'] is None else np.result_type(column['dtype'], dtype)
+                    except Exception:
+                        column['numeric'] = False
+                column['count'] += len(values)
+                column['types'].update(type(value) for value in values)
+
+        numeric_columns = {}
+        float_columns = []
+        for key, column in columns.items():
+            if column['count'] == n_rows and column['numeric']:
+                numeric_columns[key] = column['dtype']
+            elif column['count'] < n_rows and column['types'] <= {int, float}:
+                float_columns.append(key)
+
+        spool.seek(0)
+        header = True
+        offset = 0
+        with open_project_data_writer(parquet_file) if parquet_file else nullcontext() as writer:
+            for chunk in chunked(map(json.loads, spool), chunk_size):
+                if writer is not None:
+                    write_project_data_chunk(writer, build_typed_frame(chunk))
+                df = pd.DataFrame(chunk, columns=[key for key in columns if key != 'index'])
+                df.index = range(offset, offset + len(chunk))
+                offset += len(chunk)
+                df = df.reset_index()
+                for key in float_columns:
+                    df[key] = df[key].astype(float)
+                df['Niveau de risque'] = df['Niveau de risque'].fillna('NC')
+                df = df.fillna('N/A')
+                for key, dtype in numeric_columns.items():
+                    df[key] = pd.to_numeric(df[key]).astype(dtype)
+
+                df = normalize_units(df)
+                df.to_csv(file_name, index=False, sep=';', mode='w' if header else 'a', header=header)
+                header = False
+
+def main(chunk_size=None, workers=1, manifest_path='extraction_manifest.db', parquet_file=PROJECT_DATA_FILE,
+         metrics_file=None, metrics_port=None, corpus_file=None):
+    if metrics_file or metrics_port:
+        # Per-field regex timings are only collected for pages parsed in this process (workers=1).
+        metrics.enable(metrics_file, metrics_port)
+    # With corpus_file, the pages are streamed from that packed store instead of project_txt_files.
+    corpus_store = CorpusStore(corpus_file) if corpus_file else None
+    try:
+        with metrics.timer("stage_seconds", stage="extract"):
+            run_extraction(chunk_size, workers, manifest_path, parquet_file, corpus_store=corpus_store)
+    finally:
+        if corpus_store is not None:
+            corpus_store.close()
+    metrics.flush()
+
+def run_extraction(chunk_size=None, workers=1, manifest_path='extraction_manifest.db', parquet_file=PROJECT_DATA_FILE,
+                   folder_txt="project_txt_files", file_name='project_data.csv', corpus_store=None):
+    if chunk_size:
+        stream_text_to_csv(folder_txt, file_name, limit=None, chunk_size=chunk_size, workers=workers,
+                           manifest_path=manifest_path, parquet_file=parquet_file, corpus_store=corpus_store)
+        print(f"Data saved to '{file_name}'")
+        if parquet_file:
+            print(f"Typed data saved to '{parquet_file}'")
+        return
+
+    records = list(iter_records(folder_txt, limit=None, workers=workers, manifest_path=manifest_path,
+                                corpus_store=corpus_store))
+    data = finalize_frame(records)
+    data = normalize_units(data)
 
-    file_name = 'project_data.csv'
     data.to_csv(file_name, index=False, sep=';')
     print(f"Data saved to '{file_name}'")
 
+    if parquet_file:
+        save_project_data(build_typed_frame(records), parquet_file)
+        print(f"Typed data saved to '{parquet_file}'")
+
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
@@ -0,0 +1,216 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+from pacing import RateLimiter
+from metrics import metrics
+
+
+BLOCK_TAGS = [
+    "address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "fieldset", "figcaption", "figure",
+    "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p",
+    "pre", "section", "table", "tr", "ul", "button", "label", "option",
+]
+HIDDEN_TAGS = ["script", "style", "noscript", "template", "head"]
+INLINE_SPACES_PATTERN = re.compile(r'[ \t\r\f\v\xa0]+')
+
+
+def project_file_path(url, output_dir="project_txt_files"):
+    project_id = url.split('-')[-1]
+    return os.path.join(output_dir, f"project_{project_id}.txt")
+
+
+def project_saved(url, output_dir="project_txt_files", corpus_store=None):
+    if corpus_store is not None:
+        return corpus_store.has(url.split('-')[-1])
+    return os.path.exists(project_file_path(url, output_dir))
+
+
+def save_project_text(url, project_text, output_dir="project_txt_files", corpus_store=None):
+    """
+    Save the text of a project page to project_{id}.txt in output_dir or, when a
+    corpus_store is given, as a new snapshot of the project in the store.
+    Returns where it was saved.
+    """
+    project_id = url.split('-')[-1]
+    if corpus_store is not None:
+        corpus_store.put(project_id, project_text)
+        return f"{corpus_store.pack_file} (project {project_id})"
+    file_path = project_file_path(url, output_dir)
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(project_text)
+    return file_path
+
+
+def create_session(selenium_cookies=(), pool_size=16, retries=3):
+    """
+    Build a requests.Session sharing the cookies of a logged-in Selenium driver,
+    with a connection pool large enough for pool_size concurrent requests.
+    """
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    for cookie in selenium_cookies:
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+    return session
+
+
+def extract_page_text(html):
+    """
+    Visible text of an HTML page, one line per block element, close to what
+    Selenium returns for driver.find_element(By.CSS_SELECTOR, "body").text.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    for tag in soup.find_all(HIDDEN_TAGS):
+        tag.decompose()
+    for tag in soup.find_all("br"):
+        tag.replace_with("\n")
+    for tag in soup.find_all(BLOCK_TAGS):
+        tag.insert_before("\n")
+        tag.insert_after("\n")
+
+    root = soup.body or soup
+    lines = (INLINE_SPACES_PATTERN.sub(' ', line).strip() for line in root.get_text().split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def fetch_project_text(session, url, rate_limiter=None, timeout=30):
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    start = time.perf_counter()
+    try:
+        response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+    except Exception:
+        metrics.incr("http_fetches", status="failed")
+        if rate_limiter is not None:
+            rate_limiter.record(time.perf_counter() - start, ok=False)
+        raise
+    metrics.observe("http_fetch_seconds", time.perf_counter() - start)
+    metrics.incr("http_fetches", status="ok")
+    if rate_limiter is not None:
+        rate_limiter.record(time.perf_counter() - start)
+    if 'login.php' in response.url:
+        raise RuntimeError("Session is not logged in (redirected to the login page)")
+    return extract_page_text(response.content)
+
+
+def parse_listing_urls(html, website_url):
+    """
+    Project urls of the bloc_projet_financer cards of a listing page or fragment,
+    taken from their onclick attribute like main.get_url_of_all_projects does.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    project_urls = []
+    for card in soup.select(".bloc_projet_financer[onclick]"):
+        parts = card['onclick'].split("'")
+        if len(parts) > 1:
+            project_urls.append(f"{website_url}{parts[1]}")
+    return project_urls
+
+
+def discover_project_urls(session, website_url, listing_page_url, workers=8, start_page=1, max_pages=1000,
+                          rate_limiter=None, timeout=30):
+    """
+    List the projects by calling the paginated endpoint behind the 'Voir plus de projets'
+    button directly. listing_page_url is a format string with a {page} field. Pages are
+    fetched `workers` at a time and the discovery stops at the first page, in page order,
+    that brings no new project id or that fails once the retries of the session are spent.
+    The urls found until then are returned.
+    """
+    def fetch_listing_page(page):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            response = session.get(listing_page_url.format(page=page), timeout=timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to fetch listing page {page}: {e}")
+            return None
+        return parse_listing_urls(response.content, website_url)
+
+    start = time.monotonic()
+    project_urls = []
+    seen_ids = set()
+    page = start_page
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while page < start_page + max_pages:
+            pages = range(page, min(page + workers, start_page + max_pages))
+            for page, page_urls in zip(pages, executor.map(fetch_listing_page, pages)):
+                if page_urls is None:
+                    print(f"Discovered {len(project_urls)} projects in {time.monotonic() - start:.1f}s "
+                          f"(stopped at listing page {page})")
+                    return project_urls
+                new_urls = [url for url in page_urls if url.split('-')[-1] not in seen_ids]
+                if not new_urls:
+                    print(f"Listing page {page} has no new projects, stopping")
+                    print(f"Discovered {len(project_urls)} projects in {time.monotonic() - start:.1f}s")
+                    return project_urls
+                for url in new_urls:
+                    seen_ids.add(url.split('-')[-1])
+                    project_urls.append(url)
+            page = pages[-1] + 1
+
+    print(f"Discovered {len(project_urls)} projects in {time.monotonic() - start:.1f}s (max_pages reached)")
+    return project_urls
+
+
+def fetch_projects(session, project_urls, output_dir="project_txt_files", workers=16, requests_per_second=20,
+                   slow_threshold=5, crawl_state=None, skip_existing=True, on_fetched=None, stop=None,
+                   corpus_store=None):
+    """
+    Fetch the project pages over HTTP with `workers` threads, under a per-host rate limit
+    that backs off on failed or slow (> slow_threshold seconds) responses, and save their
+    text to project_{id}.txt, or to corpus_store when one is given. Projects already saved
+    are skipped unless skip_existing is False. Results are recorded in crawl_state when one is given.
+    on_fetched(url, file_path, project_text) is called from the fetching thread after each
+    page is saved. Once the stop event is set, the remaining urls are left unfetched.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pending = []
+    for url in project_urls:
+        if skip_existing and project_saved(url, output_dir, corpus_store):
+            print(f"Project {url.split('-')[-1]} already saved, skipping...")
+        else:
+            pending.append(url)
+
+    rate_limiters = {}
+    for url in pending:
+        host = urlparse(url).netloc
+        if host not in rate_limiters:
+            rate_limiters[host] = RateLimiter(requests_per_second, burst=workers, slow_threshold=slow_threshold)
+
+    def fetch_and_save(url):
+        if stop is not None and stop.is_set():
+            return False
+        try:
+            project_text = fetch_project_text(session, url, rate_limiters[urlparse(url).netloc])
+            file_path = save_project_text(url, project_text, output_dir, corpus_store)
+            print(f"Successfully fetched and saved {url} to {file_path}")
+            if crawl_state is not None:
+                crawl_state.mark_fetched(url, project_text)
+        except Exception as e:
+            print(f"Failed to fetch {url}: {e}")
+            if crawl_state is not None:
+                crawl_state.mark_failed(url, e)
+            return False
+        if on_fetched is not None:
+            on_fetched(url, file_path, project_text)
+        return True
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(fetch_and_save, pending))
+    elapsed = time.monotonic() - start
+
+    n_fetched = sum(results)
+    if pending:
+        print(f"Fetched {n_fetched}/{len(pending)} pages in {elapsed:.1f}s ({n_fetched / max(elapsed, 1e-9):.1f} pages/s)")
+    return n_fetched
@@ -0,0 +1,98 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+
+LLM_CACHE_FILE = 'llm_cache.db'
+
+
+def request_key(model, temperature, messages, max_tokens):
+    request = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages, "max_tokens": max_tokens},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Chat completions stored in SQLite, keyed by the hash of the model, temperature,
+    messages and max_tokens of the request.
+
+    Entries older than max_age seconds are dropped and, past max_entries, the least
+    recently used ones are evicted. hits and misses count the lookups of this process.
+    Safe to share between the request threads.
+    """
+
+    def __init__(self, file_name=LLM_CACHE_FILE, max_entries=None, max_age=None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(file_name, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    response TEXT,
+                    created REAL,
+                    last_used REAL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)")
+        self.evict()
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT response, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age is not None and row[1] < now - self.max_age:
+                self.conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completions (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response, ensure_ascii=False), now, now),
+            )
+            self.evict_lru()
+
+    def evict(self):
+        with self.lock, self.conn:
+            if self.max_age is not None:
+                self.conn.execute("DELETE FROM completions WHERE created < ?", (time.time() - self.max_age,))
+            self.evict_lru()
+
+    def evict_lru(self):
+        # Called with the lock held, inside a transaction.
+        if self.max_entries is not None:
+            self.conn.execute(
+                "DELETE FROM completions WHERE key NOT IN "
+                "(SELECT key FROM completions ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        with self.lock:
+            entries, = self.conn.execute("SELECT COUNT(*) FROM completions").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+        }
@@ -0,0 +1,167 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+import requests
+from requests.adapters import HTTPAdapter
+from llm_cache import request_key
+from metrics import metrics
+
+
+LMSTUDIO_URL = "http://localhost:1234/v1/chat/completions"
+LMSTUDIO_MODEL = 'qwen2.5-coder-7b-instruct'
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class RetryableResponse(requests.exceptions.HTTPError):
+    # An HTTPError, so that a request still failing after the retries is handled like any
+    # other failed request by the callers.
+    pass
+
+
+class MalformedStream(requests.exceptions.RequestException):
+    pass
+
+
+def estimate_tokens(messages):
+    # About 4 characters per token, for when the server does not report the usage.
+    return sum(len(message['content']) for message in messages) // 4
+
+
+def read_stream(response, stop_when):
+    """
+    Assemble a chat completion from a server-sent events stream, reading it only until
+    stop_when(content) is true. Closing the response then makes the server stop generating.
+    When the server sends no usage, completion_tokens counts the content deltas received.
+    """
+    content = ""
+    deltas = 0
+    usage = None
+    finish_reason = None
+    for line in response.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        data = line[len(b"data:"):].strip()
+        if data == b"[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError as e:
+            # A truncated or garbled event: the request is retried.
+            raise MalformedStream(f"Malformed stream chunk {data[:100]!r}: {e}", response=response)
+        if chunk.get('usage'):
+            usage = chunk['usage']
+        for choice in chunk.get('choices', []):
+            piece = choice.get('delta', {}).get('content')
+            if piece:
+                content += piece
+                deltas += 1
+            finish_reason = choice.get('finish_reason') or finish_reason
+        if stop_when(content):
+            finish_reason = 'stop'
+            break
+    return {
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': finish_reason}],
+        'usage': usage or {'completion_tokens': deltas},
+    }
+
+
+class LLMClient:
+    """
+    Chat completions client for LM Studio or any OpenAI-compatible server.
+
+    Requests go through a keep-alive connection pool and at most max_in_flight of them
+    are sent at a time, so the server can batch them without being flooded.
+    Connection errors, timeouts, 408/429/5xx responses and malformed streams are retried
+    up to `retries` times with exponential backoff.
+    With stop_when, the completion is streamed and read only until stop_when(content) is true.
+    When a cache (llm_cache.LLMCache) is given, identical requests are answered from it
+    instead of calling the server again.
+    """
+
+    def __init__(self, url=LMSTUDIO_URL, model=LMSTUDIO_MODEL, max_in_flight=4, timeout=300, retries=3, backoff=1.0,
+                 cache=None):
+        self.url = url
+        self.model = model
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def chat(self, messages, temperature, max_tokens, response_format=None, stop_when=None):
+        payload = {
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            'model': self.model
+        }
+        if response_format is not None:
+            payload['response_format'] = response_format
+        if stop_when is not None:
+            payload['stream'] = True
+            payload['stream_options'] = {'include_usage': True}
+        if self.cache is not None:
+            key = request_key(self.model, temperature, messages, max_tokens)
+            cached = self.cache.get(key)
+            metrics.incr("llm_cache_lookups", result="miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                with self.slots:
+                    with self.session.post(self.url, json=payload, timeout=self.timeout, stream=stop_when is not None) as response:
+                        if response.status_code in RETRY_STATUSES:
+                            raise RetryableResponse(f"{response.status_code} {response.reason}", response=response)
+                        response.raise_for_status()
+                        chat_completion = read_stream(response, stop_when) if stop_when is not None else response.json()
+                if stop_when is not None:
+                    # The usage chunk comes last, so a stream stopped early has no prompt token count.
+                    chat_completion['usage'].setdefault('prompt_tokens', estimate_tokens(messages))
+                metrics.observe("llm_request_seconds", time.perf_counter() - start)
+                metrics.incr("llm_requests", status="ok")
+                usage = chat_completion.get('usage') or {}
+                metrics.incr("llm_prompt_tokens", usage.get('prompt_tokens', 0))
+                metrics.incr("llm_completion_tokens", usage.get('completion_tokens', 0))
+                if self.cache is not None:
+                    self.cache.put(key, chat_completion)
+                return chat_completion
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError, RetryableResponse, MalformedStream) as e:
+                if attempt == self.retries:
+                    metrics.incr("llm_requests", status="failed")
+                    raise
+                metrics.incr("llm_retries")
+                delay = self.backoff * 2 ** attempt * (1 + random.random() / 2)
+                print(f"LM Studio request failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def map(self, function, items):
+        """
+        Run function on every (key, item) pair of items on max_in_flight threads and yield
+        (key, result) pairs as they complete, so each result can be stored under its key
+        whatever order the requests finish in.
+        items is consumed lazily, a few items ahead of the requests in flight.
+        """
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            futures = {executor.submit(function, item): key for key, item in islice(items, 2 * self.max_in_flight)}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for key, item in islice(items, 1):
+                        futures[executor.submit(function, item)] = key
+                    yield futures.pop(future), future.result()
+
+    def close(self):
+        self.session.close()
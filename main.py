@@ -4,49 +4,81 @@ from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import time
 import os
-import requests
+from http_fetcher import create_session, fetch_projects, discover_project_urls, save_project_text
+from browser_pool import scrape_with_browser_pool
+from crawl_state import CrawlState
+from fici_downloader import download_ficis
+from pipeline import run_pipeline
+from corpus_store import CorpusStore
+from metrics import metrics
+from pacing import RateLimiter, StepTimer, navigate, wait_for_url_change, wait_for_more_elements
 
 
-def main():
+def create_driver(download_dir=r"\fici_pdf", headless=False):
 
     service = Service('geckodriver.exe') 
 
     options = Options()
     options.binary_location = r'C:\Program Files\Mozilla Firefox\firefox.exe'  
-
-    download_dir = r"\fici_pdf"  
-    os.makedirs(download_dir, exist_ok=True)  
+    if headless:
+        options.add_argument("-headless")
 
     options.set_preference("browser.download.folderList", 2) 
     options.set_preference("browser.download.dir", download_dir)  
     options.set_preference("browser.helperApps.neverAsk.saveToDisk", "application/pdf")  
     options.set_preference("pdfjs.disabled", True)  
 
-    driver = webdriver.Firefox(service=service, options=options)
+    return webdriver.Firefox(service=service, options=options)
+
 
-    login_url = "https://www.pretup.fr/login.php"
+def main(website_url="https://www.pretup.fr/", fetch_mode="selenium", workers=16, requests_per_second=20,
+         browser_workers=4, pages_per_second=2, max_retries=3, refetch_older_than=None, discovery_mode="selenium",
+         listing_page_url=None, download_fici_files=False, fici_workers=4, fici_requests_per_second=4,
+         metrics_file=None, metrics_port=None, analysis_in_flight=4, compact=False, corpus_file=None):
 
-    driver.get(login_url)
+    # Page load latencies, HTTP fetches and step durations are appended to metrics_file
+    # every minute and served for Prometheus on metrics_port, when given.
+    if metrics_file or metrics_port:
+        metrics.enable(metrics_file, metrics_port, flush_interval=60)
+
+    download_dir = r"\fici_pdf"  
+    os.makedirs(download_dir, exist_ok=True)  
 
-    time.sleep(1)
+    driver = create_driver(download_dir)
 
-    email_input = driver.find_element(By.ID, "user")
-    email_input.send_keys("your_email_adress")  # Replace with your actual email
+    # Page loads wait for the page to be ready instead of sleeping, and are paced
+    # by a rate limiter that slows down when pages get slow or fail to load.
+    timer = StepTimer()
+    rate_limiter = RateLimiter(pages_per_second, slow_threshold=5)
 
-    password_input = driver.find_element(By.ID, "mdp")
-    password_input.send_keys("your_password")  # Replace with your actual password
+    # Every known project url lives in the crawl state, with the outcome of its last fetch.
+    crawl_state = CrawlState()
+    crawl_state.import_url_file('project_urls.txt')
 
-    login_button = driver.find_element(By.CSS_SELECTOR, 'button[type="submit"]')  # Adjust if necessary
-    login_button.click()
+    # With corpus_file, page texts are appended to that packed store (see corpus_store.py)
+    # instead of one file per project.
+    corpus_store = CorpusStore(corpus_file) if corpus_file else None
 
-    time.sleep(1)
+    login_url = f"{website_url}login.php"
 
-    projects_url = "https://www.pretup.fr/projets-a-financer" 
-    driver.get(projects_url)
+    with timer.step("login"):
+        navigate(driver, login_url, rate_limiter, ready_locator=(By.ID, "user"))
 
-    time.sleep(1)
+        email_input = driver.find_element(By.ID, "user")
+        email_input.send_keys("your_email_adress")  # Replace with your actual email
+
+        password_input = driver.find_element(By.ID, "mdp")
+        password_input.send_keys("your_password")  # Replace with your actual password
+
+        login_button = driver.find_element(By.CSS_SELECTOR, 'button[type="submit"]')  # Adjust if necessary
+        login_button.click()
+
+        wait_for_url_change(driver, login_url)
+
+    projects_url = f"{website_url}projets-a-financer" 
+    with timer.step("listing page"):
+        navigate(driver, projects_url, rate_limiter, ready_locator=(By.CLASS_NAME, 'bloc_projet_financer'))
 
 
     def load_all_projects(max_clicks=999):
@@ -57,15 +89,17 @@ def main():
                     EC.element_to_be_clickable((By.ID, "bouton_voir_plus_projets"))
                 )
 
-                driver.execute_script("arguments[0].click();", load_more_button)
-                total_clicks += 1
-                print(f"Clicked 'Voir plus de projets' {total_clicks} time(s)")
+                previous_count = len(driver.find_elements(By.CLASS_NAME, 'bloc_projet_financer'))
+                with timer.step("voir plus"):
+                    driver.execute_script("arguments[0].click();", load_more_button)
+                    total_clicks += 1
+                    print(f"Clicked 'Voir plus de projets' {total_clicks} time(s)")
 
-                time.sleep(2)
+                    # Ready as soon as the new cards are in the page.
+                    card_count = wait_for_more_elements(
+                        driver, (By.CLASS_NAME, 'bloc_projet_financer'), previous_count)
 
-                project_cards = driver.find_elements(By.CLASS_NAME, 'bloc_projet_financer')
-                
-                if len(project_cards) <= 6 * total_clicks: # Number of projects per load
+                if card_count <= 6 * total_clicks: # Number of projects per load
                     print("No more projects found or reached limit.")
                     break
             except Exception as e:
@@ -87,88 +121,117 @@ def main():
             except Exception as e:
                 print(f"Failed to extract URL from card: {e}")
 
-        
-        with open('project_urls.txt', 'r+') as f:
-            existing_urls = f.read().splitlines()
-            for url in project_urls:
-                if url not in existing_urls:
-                    f.write(url + '\n')
-                    print(f"URL added: {url}")
-                else:
-                    print(f"URL already present in file: {url}")
-        print(f"Total project URLs found: {len(project_urls)}")
-
+        register_project_urls(project_urls)
         return project_urls
 
-
-    # Function to download the FICI file using requests and Selenium's session cookies
-    def download_fici(url):
-        print(f"Navigating to project URL: {url}")
-        driver.get(url)
-        time.sleep(2)
-
-        try:
-            download_button = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "a.btn[href*='telecharger_fici.php']"))
-            )
-            fici_link = download_button.get_attribute('href')
-            print(f'Downloading FICI from: {fici_link}')
-            selenium_cookies = driver.get_cookies()
-            cookies = {cookie['name']: cookie['value'] for cookie in selenium_cookies}
-            response = requests.get(fici_link, cookies=cookies)
-            
-            if response.status_code == 200:
-                pdf_filename = os.path.join(download_dir, f'fici_{url.split("/")[-1]}.pdf')
-                with open(pdf_filename, 'wb') as f:
-                    f.write(response.content)
-                print(f"Successfully downloaded to: {pdf_filename}")
-            else:
-                print(f"Failed to download FICI from {fici_link}: Status code {response.status_code}")
-            time.sleep(2)
-            
-        except Exception as e:
-            print(f"Failed to download FICI from {url}: {e}")
+    def register_project_urls(project_urls):
+        new_urls = crawl_state.add_urls(project_urls)
+        for url in new_urls:
+            print(f"URL added: {url}")
+        print(f"Total project URLs found: {len(project_urls)} ({len(new_urls)} new)")
 
 
     def scrape_project_text(url, output_dir="project_txt_files"):
         try:
-            driver.get(url)
-            time.sleep(1)  # Wait for the page to load
+            navigate(driver, url, rate_limiter, timer)
             
             project_text = driver.find_element(By.CSS_SELECTOR, "body").text
             if not os.path.exists(output_dir):
                 os.makedirs(output_dir)
-            project_id = url.split('-')[-1]
-            file_path = os.path.join(output_dir, f"project_{project_id}.txt")
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(project_text)
+            file_path = save_project_text(url, project_text, output_dir, corpus_store)
             
-            print(f"Successfully scraped and saved project {project_id} to {file_path}")
+            print(f"Successfully scraped and saved project {url.split('-')[-1]} to {file_path}")
+            crawl_state.mark_fetched(url, project_text)
+            metrics.incr("pages_scraped", status="ok")
 
         except Exception as e:
             print(f"Failed to scrape {url}: {e}")
-
-
-    website_url = "https://www.pretup.fr/"
-    project_urls = get_url_of_all_projects(website_url=website_url, max_clicks=1)
-
-    # Uncomment the following lines to load project URLs from a file if needed
-    # with open('project_urls.txt', 'r') as f:
-    #     project_urls = f.read().splitlines()
-
-    for project_url in project_urls:
-
-        output_dir = "project_txt_files"  
-        project_id = project_url.split('-')[-1]
-        file_path = os.path.join(output_dir, f"project_{project_id}.txt")
-        if os.path.exists(file_path):
-            print(f"File already exists for project {project_id}, skipping...")
-            continue 
+            crawl_state.mark_failed(url, e)
+            metrics.incr("pages_scraped", status="failed")
+
+
+    with timer.step("list projects"):
+        if discovery_mode == "http":
+            # Call the paginated endpoint behind the 'Voir plus de projets' button
+            # directly instead of clicking it. Check the request the button sends
+            # in the browser dev tools if the site changes.
+            if listing_page_url is None:
+                listing_page_url = f"{website_url}projets-a-financer?page={{page}}"
+            session = create_session(driver.get_cookies(), pool_size=workers)
+            project_urls = discover_project_urls(
+                session, website_url, listing_page_url, workers=workers,
+                rate_limiter=RateLimiter(requests_per_second, burst=workers, slow_threshold=5),
+            )
+            register_project_urls(project_urls)
         else:
-            # Uncomment if you want to download fici files for further analysis
-            # download_fici(project_url)
-            scrape_project_text(project_url)
-    driver.quit()
+            project_urls = get_url_of_all_projects(website_url=website_url, max_clicks=1)
+
+    # Resume from the crawl state: new projects, failed ones that can be retried and,
+    # if refetch_older_than (seconds) is set, the ones fetched before that.
+    crawl_state.mark_existing_files("project_txt_files")
+    project_urls = crawl_state.pending_urls(max_retries=max_retries, refetch_older_than=refetch_older_than)
+    print(f"{len(project_urls)} projects to fetch, crawl state: {crawl_state.counts()}")
+
+    cookies = driver.get_cookies()
+
+    if fetch_mode == "http":
+        # The browser is only needed to log in and list the projects: the detail
+        # pages are fetched concurrently over a session sharing its cookies.
+        session = create_session(cookies, pool_size=workers)
+        driver.quit()
+        with timer.step("fetch projects"):
+            fetch_projects(session, project_urls, output_dir="project_txt_files", workers=workers,
+                           requests_per_second=requests_per_second, crawl_state=crawl_state, skip_existing=False,
+                           corpus_store=corpus_store)
+
+    elif fetch_mode == "pipeline":
+        # Same HTTP fetch, but each saved page is extracted and sent to the LLM right away
+        # while the next pages are fetched, instead of waiting for the whole scrape.
+        session = create_session(cookies, pool_size=workers)
+        driver.quit()
+        with timer.step("pipeline"):
+            run_pipeline(session, project_urls, output_dir="project_txt_files", fetch_workers=workers,
+                         requests_per_second=requests_per_second, max_in_flight=analysis_in_flight,
+                         compact=compact, crawl_state=crawl_state, corpus_store=corpus_store)
+
+    elif fetch_mode == "browser_pool":
+        # For pages that need JavaScript rendering: several headless browsers share
+        # the logged-in session through its cookies and take urls from one queue.
+        driver.quit()
+        scrape_with_browser_pool(
+            project_urls,
+            create_driver=lambda: create_driver(download_dir, headless=True),
+            cookies=cookies,
+            website_url=website_url,
+            output_dir="project_txt_files",
+            workers=browser_workers,
+            # Each browser is paced on its own at pages_per_second.
+            create_rate_limiter=lambda: RateLimiter(pages_per_second, slow_threshold=5),
+            timer=timer,
+            crawl_state=crawl_state,
+            skip_existing=False,
+            corpus_store=corpus_store,
+        )
+
+    else:
+        for project_url in project_urls:
+            with timer.step("scrape page"):
+                scrape_project_text(project_url)
+        driver.quit()
+
+    if download_fici_files:
+        # Set download_fici_files=True if you want the fici files for further analysis.
+        # They are streamed over a session sharing the browser cookies, a few at a time;
+        # complete files are skipped and interrupted downloads resumed.
+        with timer.step("download ficis"):
+            download_ficis(create_session(cookies, pool_size=fici_workers), crawl_state.urls(),
+                           download_dir=download_dir, workers=fici_workers,
+                           requests_per_second=fici_requests_per_second)
+    timer.summary()
+    if corpus_store is not None:
+        print(f"Corpus store: {corpus_store.stats()}")
+        corpus_store.close()
+    metrics.flush()
 
 
 if __name__ == "__main__":
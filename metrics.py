@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LATENCY_BUCKETS = [0.000001, 0.000005, 0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q quantile.
+        """
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + [float('inf')], self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+def metric_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    """
+    Counters and latency histograms per stage, written to a JSON-lines file and
+    optionally served in the Prometheus text format.
+
+    Disabled by default: every call then returns at once, so the instrumented code
+    costs next to nothing when nobody collects the metrics.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+        self.jsonl_file = None
+        self.server = None
+        self.flusher = None
+        self.stopped = threading.Event()
+
+    def enable(self, jsonl_file=None, prometheus_port=None, flush_interval=None):
+        """
+        Start collecting. The snapshot is appended to jsonl_file on flush(), every
+        flush_interval seconds if given, and /metrics is served on prometheus_port if given.
+        """
+        self.enabled = True
+        self.started = time.time()
+        self.jsonl_file = jsonl_file
+        self.stopped.clear()
+        if prometheus_port is not None and self.server is None:
+            self.server = ThreadingHTTPServer(("0.0.0.0", prometheus_port), make_prometheus_handler(self))
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        if flush_interval and jsonl_file:
+            def flush_periodically():
+                while not self.stopped.wait(flush_interval):
+                    self.flush()
+            self.flusher = threading.Thread(target=flush_periodically, daemon=True)
+            self.flusher.start()
+
+    def disable(self):
+        self.flush()
+        self.enabled = False
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+    def incr(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = metric_key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def timer(self, name, **labels):
+        """
+        Context manager observing its duration in seconds in the `name` histogram.
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return self._timer(name, labels)
+
+    @contextmanager
+    def _timer(self, name, labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            records = [
+                {'ts': now, 'type': 'counter', 'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in self.counters.items()
+            ]
+            records += [
+                {'ts': now, 'type': 'histogram', 'name': name, 'labels': dict(labels), 'count': histogram.count,
+                 'sum': histogram.sum, 'p50': histogram.quantile(0.5), 'p99': histogram.quantile(0.99)}
+                for (name, labels), histogram in self.histograms.items()
+            ]
+        records.append({'ts': now, 'type': 'gauge', 'name': 'uptime_seconds', 'labels': {}, 'value': now - self.started})
+        return records
+
+    def flush(self):
+        if not self.enabled or not self.jsonl_file:
+            return
+        records = self.snapshot()
+        with open(self.jsonl_file, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}_total{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        lines.append(f"uptime_seconds {time.time() - self.started}")
+        return "\n".join(lines) + "\n"
+
+
+def make_prometheus_handler(metrics):
+    class PrometheusHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return PrometheusHandler
+
+
+metrics = Metrics()
@@ -0,0 +1,164 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+FEATURES = [
+    "title", "risk", "risk_scale", "challenges", "challenges_scale", "core_objective", "core_objective_scale",
+    "resources", "resources_scale", "expected_timeline", "expected_timeline_scale", "market_demand",
+    "market_demand_scale",
+]
+
+
+def count_tokens(text):
+    # Rough count, about 4 characters per token like most BPE tokenizers on French/English text.
+    return max(1, len(text) // 4)
+
+
+def split_tokens(text):
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+def render_answer(rnd):
+    fields = "\n".join(
+        f'    <div class="{name}">{rnd.randint(1, 10) if name.endswith("_scale") else "Lorem ipsum " + name}</div>'
+        for name in FEATURES
+    )
+    # Like real models, keep talking after the closing delimiter.
+    return (
+        f'<ANSWER>\n<div class="project">\n{fields}\n</div>\n</ANSWER>\n\n'
+        "These qualitative features were derived from the project description and the quantitative variables."
+    )
+
+
+def render_json_answer(rnd):
+    # Answer constrained by a response_format json_schema: a bare JSON object.
+    return json.dumps({
+        name: rnd.randint(1, 10) if name.endswith("_scale") else "Lorem ipsum " + name
+        for name in FEATURES
+    }, indent=1)
+
+
+def make_handler(model, latency, slots, failure_rate, seed, token_latency=0.0):
+    rnd = random.Random(seed)
+    rnd_lock = threading.Lock()
+    busy = threading.BoundedSemaphore(slots)
+
+    class MockLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_event(self, data):
+            chunk = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+
+        def stream_completion(self, request, content, usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            base = {"id": f"chatcmpl-{threading.get_ident()}", "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": request.get("model", model)}
+            try:
+                for token in split_tokens(content):
+                    time.sleep(token_latency)
+                    self.send_event(json.dumps({**base, "choices": [{"index": 0, "delta": {"content": token}}]}))
+                self.send_event(json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+                if request.get("stream_options", {}).get("include_usage"):
+                    self.send_event(json.dumps({**base, "choices": [], "usage": usage}))
+                self.send_event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client stopped reading: stop generating, like a real server does.
+
+        def send_json(self, body, status=200):
+            body = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/v1/models"):
+                self.send_json({"object": "list", "data": [{"id": model, "object": "model"}]})
+            else:
+                self.send_json({"error": "Not found"}, status=404)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.startswith("/v1/chat/completions"):
+                self.send_json({"error": "Not found"}, status=404)
+                return
+
+            with rnd_lock:
+                failed = rnd.random() < failure_rate
+                content = render_json_answer(rnd) if "response_format" in request else render_answer(rnd)
+            if failed:
+                self.send_json({"error": "Model is busy"}, status=503)
+                return
+
+            prompt_tokens = sum(count_tokens(message["content"]) for message in request.get("messages", []))
+            tokens = split_tokens(content)[:request.get("max_tokens", 1 << 30)]
+            content, completion_tokens = "".join(tokens), len(tokens)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+
+            # Like a local inference server, at most `slots` requests are processed at a time
+            # and the others wait in line.
+            with busy:
+                time.sleep(latency)
+                if request.get("stream"):
+                    self.stream_completion(request, content, usage)
+                    return
+                time.sleep(token_latency * completion_tokens)
+
+            self.send_json({
+                "id": f"chatcmpl-{threading.get_ident()}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", model),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+    return MockLLMHandler
+
+
+def start_mock_llm_server(port=0, model="qwen2.5-coder-7b-instruct", latency=0.2, slots=4, failure_rate=0.0, seed=0,
+                          token_latency=0.0):
+    """
+    Serve a fake OpenAI-compatible /v1/chat/completions endpoint from a background thread.
+    Every completion takes `latency` seconds plus `token_latency` per generated token, at most
+    `slots` completions run at the same time and a `failure_rate` fraction of the requests fail
+    with a 503. Streaming ("stream": true) and response_format requests are supported.
+    Returns the server and the url of its chat completions endpoint.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(model, latency, slots, failure_rate, seed, token_latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+
+def main(port=1234, latency=0.2, slots=4):
+    server, url = start_mock_llm_server(port, latency=latency, slots=slots)
+    print(f"Mock LM Studio server running on {url} ({slots} slots, {latency}s per completion, Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import html
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from fixtures import generate_page
+
+
+SESSION_COOKIE = "PHPSESSID=mock-session"
+
+
+def project_path(project_id):
+    return f"projet-entreprise-{project_id}"
+
+
+def fici_path(project_id):
+    return f"telecharger_fici.php?id={project_id}"
+
+
+def render_fici(project_id, size=200_000):
+    """
+    Deterministic stand-in for the FICI PDF of a project.
+    """
+    header = f"%PDF-1.4\n% FICI projet {project_id}\n".encode("ascii")
+    body = random.Random(project_id).randbytes(size - len(header) - 6)
+    return header + body + b"\n%%EOF"
+
+
+def render_project_page(text, project_id=None):
+    """
+    Wrap the text of a generated project page in markup similar to a Pretup detail page.
+    """
+    blocks = []
+    for line in text.split("\n"):
+        if not line:
+            continue
+        if line.startswith("Projets à financer |"):
+            name = line.split("|", 1)[1].strip()
+            blocks.append(f'<nav><a href="/projets-a-financer">Projets à financer</a> | <span>{html.escape(name)}</span></nav>')
+        else:
+            blocks.append(f"<p>{html.escape(line)}</p>")
+    if project_id is not None:
+        blocks.append(f'<a class="btn" href="/{fici_path(project_id)}"></a>')
+    return (
+        "<!DOCTYPE html><html><head><title>Pretup</title><style>p { margin: 0 }</style></head><body>"
+        "<script>var tracking = {page: 'projet'};</script>"
+        + "\n".join(blocks)
+        + "</body></html>"
+    )
+
+
+def render_listing_card(project_id):
+    return (
+        f'<div class="bloc_projet_financer" onclick="location.href=\'{project_path(project_id)}\'">'
+        f"<h3>Projet {project_id}</h3></div>"
+    )
+
+
+def make_handler(n_projects, latency, seed, page_size=6):
+    rnd = random.Random(seed)
+    pages = {project_path(i): render_project_page(generate_page(i, rnd), i) for i in range(n_projects)}
+
+    class MockPretupHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_body(self, body, status=200, content_type="text/html; charset=utf-8", headers=()):
+            body = body.encode("utf-8") if isinstance(body, str) else body
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_fici(self, body):
+            # Honour 'Range: bytes=N-' so interrupted downloads can be resumed.
+            requested = self.headers.get("Range", "")
+            if not requested.startswith("bytes="):
+                self.send_body(body, content_type="application/pdf", headers=[("Accept-Ranges", "bytes")])
+                return
+            start = int(requested[len("bytes="):].split("-")[0])
+            if start >= len(body):
+                self.send_body("", status=416, headers=[("Content-Range", f"bytes */{len(body)}")])
+            else:
+                self.send_body(body[start:], status=206, content_type="application/pdf",
+                               headers=[("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")])
+
+        def redirect(self, location, headers=()):
+            self.send_body("", status=302, headers=[("Location", location), *headers])
+
+        def logged_in(self):
+            return SESSION_COOKIE in self.headers.get("Cookie", "")
+
+        def do_GET(self):
+            time.sleep(latency)
+            path = self.path.lstrip("/").split("?")[0]
+            if path == "":
+                self.send_body('<html><body><a href="/projets-a-financer">Projets à financer</a></body></html>')
+            elif path == "login.php":
+                self.send_body(
+                    '<form method="post" action="/login.php"><input id="user" name="user">'
+                    '<input id="mdp" name="mdp" type="password"><button type="submit">Connexion</button></form>'
+                )
+            elif path == "projets-a-financer" and "page=" in self.path:
+                # Fragment returned to the 'Voir plus de projets' button, pages starting at 1.
+                page = int(self.path.split("page=")[1].split("&")[0])
+                project_ids = range((page - 1) * page_size, min(page * page_size, n_projects))
+                self.send_body("".join(render_listing_card(i) for i in project_ids))
+            elif path == "projets-a-financer":
+                cards = "".join(render_listing_card(i) for i in range(min(page_size, n_projects)))
+                self.send_body(
+                    f'<html><body><div id="projets">{cards}</div>'
+                    f'<button id="bouton_voir_plus_projets">Voir plus de projets</button></body></html>'
+                )
+            elif path == "telecharger_fici.php" and "id=" in self.path:
+                project_id = int(self.path.split("id=")[1].split("&")[0])
+                if not self.logged_in():
+                    self.redirect("/login.php")
+                elif not 0 <= project_id < n_projects:
+                    self.send_body("Not found", status=404)
+                else:
+                    self.send_fici(render_fici(project_id))
+            elif path in pages:
+                if not self.logged_in():
+                    self.redirect("/login.php")
+                else:
+                    self.send_body(pages[path])
+            else:
+                self.send_body("Not found", status=404)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.startswith("/login.php"):
+                self.redirect("/", headers=[("Set-Cookie", f"{SESSION_COOKIE}; Path=/")])
+            else:
+                self.send_body("Not found", status=404)
+
+    return MockPretupHandler
+
+
+def start_mock_server(port=0, n_projects=200, latency=0.05, seed=0):
+    """
+    Serve a fake pretup.fr (login, listing, project detail pages and FICI PDFs) from a background thread.
+    Every request waits `latency` seconds to mimic the network. Returns the server and its base url.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(n_projects, latency, seed))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def project_urls(base_url, n_projects):
+    return [f"{base_url}{project_path(i)}" for i in range(n_projects)]
+
+
+def main(port=8765, n_projects=200, latency=0.05):
+    server, base_url = start_mock_server(port, n_projects, latency)
+    print(f"Mock Pretup server running on {base_url} with {n_projects} projects (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import threading
+import time
+from functools import partial
+from collections import OrderedDict
+from transformers import pipeline
+
+
+WARMUP_INPUTS = {
+    "translation": lambda p: p("Bonjour", max_length=16),
+    "question-answering": lambda p: p(question="What is it?", context="It is a project."),
+}
+
+
+def pipeline_size(analysis_pipeline):
+    """
+    Memory taken by the weights of a pipeline's model, in bytes.
+    """
+    weights_bytes = getattr(analysis_pipeline, 'weights_bytes', None)
+    if weights_bytes is not None:
+        return weights_bytes
+    model = getattr(analysis_pipeline, 'model', None)
+    if model is None or not hasattr(model, 'parameters'):
+        return 0
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+def load_backend(backend="pytorch", threads=None):
+    """
+    Pipeline loader of an inference backend: "pytorch" for the transformers pipelines, or
+    "onnx" for the int8 ONNX Runtime pipelines of onnx_backend.py, running on `threads`
+    intra-op threads. Both are called the same way.
+    """
+    if backend == "pytorch":
+        return pipeline
+    if backend == "onnx":
+        # onnxruntime and optimum are only needed by this backend.
+        from onnx_backend import onnx_pipeline
+        return partial(onnx_pipeline, threads=threads)
+    raise ValueError(f"Unknown inference backend {backend!r}, expected 'pytorch' or 'onnx'")
+
+
+class ModelRegistry:
+    """
+    Hugging Face pipelines loaded once per (task, model) and reused across calls.
+
+    Pipelines are loaded on first use. When memory_budget_mb is set and the loaded models
+    take more than that, the least recently used ones are unloaded. Safe to share between threads.
+    """
+
+    def __init__(self, memory_budget_mb=None, loader=pipeline):
+        self.memory_budget_mb = memory_budget_mb
+        self.loader = loader
+        self.backend = "pytorch"
+        self.pipelines = OrderedDict()
+        self.sizes = {}
+        self.lock = threading.Lock()
+        self.stats = {'loads': 0, 'hits': 0, 'evictions': 0, 'load_seconds': 0.0}
+
+    def get(self, task, model, **kwargs):
+        key = (task, model)
+        with self.lock:
+            if key in self.pipelines:
+                self.pipelines.move_to_end(key)
+                self.stats['hits'] += 1
+                return self.pipelines[key]
+
+            start = time.perf_counter()
+            analysis_pipeline = self.loader(task, model=model, **kwargs)
+            self.stats['load_seconds'] += time.perf_counter() - start
+            self.stats['loads'] += 1
+            print(f"Loaded {task} model {model} in {time.perf_counter() - start:.1f}s")
+
+            self.pipelines[key] = analysis_pipeline
+            self.sizes[key] = pipeline_size(analysis_pipeline)
+            self.evict(keep=key)
+            return analysis_pipeline
+
+    def evict(self, keep=None):
+        if self.memory_budget_mb is None:
+            return
+        budget = self.memory_budget_mb * 1024 ** 2
+        for key in list(self.pipelines):
+            if sum(self.sizes.values()) <= budget:
+                break
+            if key == keep:
+                continue
+            del self.pipelines[key]
+            del self.sizes[key]
+            self.stats['evictions'] += 1
+            print(f"Unloaded {key[0]} model {key[1]} (memory budget {self.memory_budget_mb} MB)")
+
+    def set_backend(self, backend, threads=None):
+        """
+        Load the next pipelines with the given backend (see load_backend), unloading the
+        ones loaded with another backend.
+        """
+        loader = load_backend(backend, threads)
+        with self.lock:
+            if backend != self.backend:
+                self.pipelines.clear()
+                self.sizes.clear()
+            self.loader = loader
+            self.backend = backend
+
+    def warmup(self, models):
+        """
+        Load the given (task, model) pairs now and run each once on a tiny input,
+        so the first rows do not pay for the loading.
+        """
+        for task, model in models:
+            analysis_pipeline = self.get(task, model)
+            WARMUP_INPUTS.get(task, lambda p: p("Warm up"))(analysis_pipeline)
+
+    def memory_mb(self):
+        with self.lock:
+            return sum(self.sizes.values()) / 1024 ** 2
+
+    def clear(self):
+        with self.lock:
+            self.pipelines.clear()
+            self.sizes.clear()
+
+
+registry = ModelRegistry()
+
+
+def get_pipeline(task, model, **kwargs):
+    """
+    Shared pipeline for (task, model) from the process-wide registry.
+    """
+    return registry.get(task, model, **kwargs)
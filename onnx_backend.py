@@ -0,0 +1,98 @@
+import os
+import shutil
+import platform
+import time
+import psutil
+import onnxruntime
+from transformers import AutoTokenizer, pipeline
+from optimum.onnxruntime import (
+    ORTModelForQuestionAnswering, ORTModelForSeq2SeqLM, ORTModelForSequenceClassification, ORTQuantizer,
+)
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+
+ONNX_CACHE_DIR = 'onnx_models'
+ORT_MODEL_CLASSES = {
+    "translation": ORTModelForSeq2SeqLM,
+    "text-classification": ORTModelForSequenceClassification,
+    "sentiment-analysis": ORTModelForSequenceClassification,
+    "question-answering": ORTModelForQuestionAnswering,
+}
+
+
+def quantization_config():
+    # Dynamic quantization: weights are stored in int8 and activations are quantized on
+    # the fly, so no calibration data is needed.
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+
+def session_options(threads=None):
+    """
+    ONNX Runtime options for CPU inference. The intra-op threads default to the number of
+    physical cores: hyper-threads only compete for the same matrix units.
+    """
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads or psutil.cpu_count(logical=False) or os.cpu_count()
+    options.inter_op_num_threads = 1
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+def model_dir(task, model, cache_dir=ONNX_CACHE_DIR, quantize=True):
+    model_class = ORT_MODEL_CLASSES[task].__name__
+    return os.path.join(cache_dir, f"{model.replace('/', '--')}-{model_class}-{'int8' if quantize else 'fp32'}")
+
+
+def export_model(task, model, target_dir, quantize=True):
+    """
+    Export the Hugging Face model to ONNX in target_dir, with its tokenizer, and quantize
+    every ONNX graph to int8 in place when quantize is True.
+    The files are written to a temporary folder first, so an interrupted export is redone.
+    """
+    start = time.perf_counter()
+    build_dir = f"{target_dir}.tmp"
+    shutil.rmtree(build_dir, ignore_errors=True)
+    ORT_MODEL_CLASSES[task].from_pretrained(model, export=True).save_pretrained(build_dir)
+    AutoTokenizer.from_pretrained(model).save_pretrained(build_dir)
+
+    if quantize:
+        for file_name in sorted(os.listdir(build_dir)):
+            if not file_name.endswith(".onnx"):
+                continue
+            quantized_dir = os.path.join(build_dir, "quantized")
+            quantizer = ORTQuantizer.from_pretrained(build_dir, file_name=file_name)
+            quantizer.quantize(save_dir=quantized_dir, quantization_config=quantization_config())
+            # Same file names as the fp32 export, so the model class loads the int8 graphs.
+            os.replace(os.path.join(quantized_dir, file_name.replace(".onnx", "_quantized.onnx")),
+                       os.path.join(build_dir, file_name))
+            shutil.rmtree(quantized_dir)
+
+    os.replace(build_dir, target_dir)
+    print(f"Exported {task} model {model} to {target_dir} in {time.perf_counter() - start:.1f}s")
+
+
+def onnx_pipeline(task, model=None, cache_dir=ONNX_CACHE_DIR, quantize=True, threads=None, **kwargs):
+    """
+    Drop-in replacement for transformers.pipeline running the model with ONNX Runtime on CPU.
+
+    The model is exported to ONNX and quantized to int8 on first use, and the artifacts
+    are cached in cache_dir for the next runs. The returned object is a regular transformers
+    pipeline, called exactly like the PyTorch one.
+    """
+    target_dir = model_dir(task, model, cache_dir, quantize)
+    if not os.path.isdir(target_dir):
+        export_model(task, model, target_dir, quantize)
+
+    ort_model = ORT_MODEL_CLASSES[task].from_pretrained(
+        target_dir, provider="CPUExecutionProvider", session_options=session_options(threads),
+    )
+    analysis_pipeline = pipeline(task, model=ort_model, tokenizer=AutoTokenizer.from_pretrained(target_dir), **kwargs)
+    # Read by the model registry, which cannot count the parameters of an ONNX model.
+    analysis_pipeline.weights_bytes = sum(
+        os.path.getsize(os.path.join(target_dir, file_name))
+        for file_name in os.listdir(target_dir) if file_name.endswith((".onnx", ".onnx_data"))
+    )
+    return analysis_pipeline
@@ -0,0 +1,136 @@
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from metrics import metrics
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` requests per second with bursts of up to `burst` requests.
+
+    The rate adapts to the responses reported through record(): a failed or slow
+    response (above slow_threshold seconds) divides the rate by backoff_factor,
+    down to min_rate, and every fast successful response adds recovery_step back,
+    up to the configured rate.
+    """
+
+    def __init__(self, rate, burst=1, min_rate=None, slow_threshold=None, backoff_factor=2, recovery_step=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.slow_threshold = slow_threshold
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step if recovery_step is not None else rate / 20
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def record(self, latency, ok=True):
+        with self.lock:
+            slow = self.slow_threshold is not None and latency > self.slow_threshold
+            if not ok or slow:
+                self.rate = max(self.min_rate, self.rate / self.backoff_factor)
+                self.tokens = min(self.tokens, 0)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.recovery_step)
+
+
+class StepTimer:
+    """
+    Collect the wall-clock time spent in each named step and print it as it goes.
+    """
+
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.durations = defaultdict(list)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.observe("step_seconds", elapsed, step=name)
+            with self.lock:
+                self.durations[name].append(elapsed)
+            if self.verbose:
+                print(f"[timing] {name}: {elapsed:.3f}s")
+
+    def summary(self):
+        print("Time per step:")
+        for name, durations in sorted(self.durations.items(), key=lambda item: -sum(item[1])):
+            print(f"  {name:<20} n={len(durations):<6} total={sum(durations):8.2f}s "
+                  f"mean={sum(durations) / len(durations):6.3f}s max={max(durations):6.3f}s")
+
+
+def wait_for_page_ready(driver, timeout=10):
+    WebDriverWait(driver, timeout).until(
+        lambda d: d.execute_script("return document.readyState") == "complete"
+    )
+
+
+def wait_for_element(driver, locator, timeout=10):
+    return WebDriverWait(driver, timeout).until(EC.presence_of_element_located(locator))
+
+
+def wait_for_url_change(driver, url, timeout=10):
+    WebDriverWait(driver, timeout).until(EC.url_changes(url))
+
+
+def wait_for_more_elements(driver, locator, previous_count, timeout=10):
+    """
+    Wait until more than previous_count elements match locator and return the new count,
+    or previous_count if nothing new appeared before the timeout.
+    """
+    def more_elements(d):
+        count = len(d.find_elements(*locator))
+        return count if count > previous_count else False
+
+    try:
+        return WebDriverWait(driver, timeout).until(more_elements)
+    except TimeoutException:
+        return previous_count
+
+
+def navigate(driver, url, rate_limiter=None, timer=None, ready_locator=(By.CSS_SELECTOR, "body"), timeout=10):
+    """
+    driver.get(url) paced by rate_limiter, returning once ready_locator is present and the
+    document has finished loading. The page load time is reported to the rate limiter so
+    that slow or failing pages slow the crawl down.
+    """
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    start = time.perf_counter()
+    ok = False
+    try:
+        with timer.step("driver.get") if timer is not None else nullcontext():
+            driver.get(url)
+            wait_for_element(driver, ready_locator, timeout)
+            wait_for_page_ready(driver, timeout)
+        ok = True
+    finally:
+        latency = time.perf_counter() - start
+        metrics.observe("page_load_seconds", latency)
+        metrics.incr("page_loads", status="ok" if ok else "failed")
+        if rate_limiter is not None:
+            rate_limiter.record(latency, ok)
@@ -1,34 +1,59 @@
-from transformers import pipeline
+import os
 import re
+import json
+import hashlib
 import pandas as pd
 import numpy as np
 from tqdm import tqdm
 import requests
+from project_data import load_project_data, PROJECT_DATA_FILE
+from llm_client import LLMClient
+from llm_cache import LLMCache, LLM_CACHE_FILE
+from metrics import metrics
 
 def preprocess_text(text):
     text = re.sub(r'\s+', ' ', text.strip())
     return text
 
-def call_lmstudio_api(messages, temperature, max_tokens):
-    url = "http://localhost:1234/v1/chat/completions"
-    headers = {"Content-Type": "application/json"}
-    
-    payload = {
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-        'model': 'qwen2.5-coder-7b-instruct'
-    }
-    
+text_columns = ['A propos']
+quantitative_columns = [
+    'Department', 'Montant Demandé', 'Taux d’intérêt annuel', 'Durée (value)',
+    'Durée de financement (value)', "Chiffre d'affaires (year)", "Chiffre d'affaires (value)",
+    'Date de création', 'Nombre de salariés'
+]
+
+FEATURE_NAMES = ['title', 'risk', 'challenges', 'core_objective', 'resources', 'expected_timeline', 'market_demand']
+
+# Same features as the HTML template of create_features, as a JSON schema sent in the
+# response_format of the request. The model then answers with a bare JSON object, which
+# costs far fewer tokens than the HTML.
+FEATURES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        field: {"type": "integer", "minimum": 1, "maximum": 10} if field.endswith("_scale") else {"type": "string"}
+        for name in FEATURE_NAMES
+        for field in ([name] if name == 'title' else [name, f"{name}_scale"])
+    },
+    "additionalProperties": False,
+}
+FEATURES_SCHEMA["required"] = list(FEATURES_SCHEMA["properties"])
+
+# Identical for every project and sent first, so the server can reuse its prompt cache.
+COMPACT_SYSTEM_PROMPT = (
+    "You are a data scientist analysing crowd-lending projects. "
+    "From the project description (in French) and its quantitative variables, fill in the "
+    "qualitative features. *_scale fields are integer scores from 1 (low) to 10 (high), the others short strings. "
+    "Answer with a single JSON object with the keys " + ", ".join(FEATURES_SCHEMA["properties"]) + " and nothing else."
+)
+
+def call_lmstudio_api(messages, temperature, max_tokens, client, response_format=None, stop_when=None):
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        return response.json()
+        return client.chat(messages, temperature, max_tokens, response_format=response_format, stop_when=stop_when)
     except requests.exceptions.RequestException as e:
         print(f"Error communicating with LM Studio: {e}")
         raise e
 
-def create_features(processed_text, quantitative_data):
+def create_features(processed_text, quantitative_data, client):
     qualitative_template = """
     <div class="project">
         <div class="title">{title}</div>
@@ -73,49 +98,250 @@ def create_features(processed_text, quantitative_data):
     chat_completion = call_lmstudio_api(
         messages=messages,
         temperature=0.5,
-        max_tokens=3200
+        max_tokens=3200,
+        client=client
     )
 
     try:
         response_text = chat_completion['choices'][0]['message']['content'].strip()
-        return response_text
+        return response_text, chat_completion.get('usage', {})
     except (KeyError, IndexError) as e:
         print(f"Error extracting response: {e}")
-        return "Error"
+        return "Error", chat_completion.get('usage', {})
 
-try:
-    df = pd.read_csv('project_data.csv', sep=';', encoding='utf-8', on_bad_lines='skip')
-except pd.errors.ParserError as e:
-    print(f"Error while parsing the file: {e}")
-    exit(1)
+def compact_quantitative_data(quantitative_data):
+    """
+    Quantitative variables as compact JSON, without the missing ones.
+    """
+    values = {key: value.item() if hasattr(value, 'item') else value
+              for key, value in quantitative_data.items() if not pd.isna(value)}
+    return json.dumps(values, ensure_ascii=False, separators=(',', ':'))
 
-text_columns = ['A propos']
-quantitative_columns = [
-    'Department', 'Montant Demandé', 'Taux d’intérêt annuel', 'Durée (value)',
-    'Durée de financement (value)', "Chiffre d'affaires (year)", "Chiffre d'affaires (value)",
-    'Date de création', 'Nombre de salariés'
-]
+def json_object_end(text):
+    """
+    End index of the first complete JSON object of text, or None if it is not complete yet.
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    try:
+        return json.JSONDecoder().raw_decode(text, start)[1]
+    except json.JSONDecodeError:
+        return None
+
+def create_compact_features(processed_text, quantitative_data, client):
+    """
+    Same features as create_features with a compact prompt: the instructions and the JSON
+    schema sit in a shared system prefix, and the answer is streamed and read only until
+    its JSON object is complete.
+    """
+    messages = [
+        {"role": "system", "content": COMPACT_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Description du projet:\n{processed_text}\n\nVariables quantitatives:\n{quantitative_data}"}
+    ]
+
+    chat_completion = call_lmstudio_api(
+        messages=messages,
+        temperature=0.5,
+        max_tokens=800,
+        client=client,
+        response_format={"type": "json_schema", "json_schema": {"name": "project_features", "schema": FEATURES_SCHEMA}},
+        # json_object_end is only tried once the text may be complete.
+        stop_when=lambda content: content.rstrip().endswith('}') and json_object_end(content) is not None
+    )
+
+    try:
+        response_text = chat_completion['choices'][0]['message']['content'].strip()
+        return response_text, chat_completion.get('usage', {})
+    except (KeyError, IndexError) as e:
+        print(f"Error extracting response: {e}")
+        return "Error", chat_completion.get('usage', {})
+
+def extract_answer(qualitative_data):
+    return qualitative_data.split("<ANSWER>")[1].split("</ANSWER>")[0].strip()
+
+def extract_json_answer(qualitative_data):
+    end = json_object_end(qualitative_data)
+    if end is None:
+        raise IndexError("No complete JSON object in the answer")
+    answer = json.loads(qualitative_data[qualitative_data.find('{'):end])
+    return json.dumps(answer, ensure_ascii=False)
+
+def analyze_row(job, client, compact=False):
+    """
+    Answer of the LLM for a row and the token usage of the request, or None if the request failed.
+    """
+    row, processed_text, quantitative_data = job
+    try:
+        if compact:
+            qualitative_data, usage = create_compact_features(processed_text, quantitative_data, client)
+        else:
+            qualitative_data, usage = create_features(processed_text, quantitative_data, client)
+    except requests.exceptions.RequestException:
+        print("Error generating qualitative features for row:", row)
+        return None
+
+    try:
+        return (extract_json_answer if compact else extract_answer)(qualitative_data), usage
+    except IndexError:
+        print("Error extracting qualitative features for row:", row)
+        return "Error", usage
+
+def input_hash(processed_text, quantitative_data):
+    return hashlib.sha256(f"{processed_text}\n{quantitative_data}".encode('utf-8')).hexdigest()
+
+class CheckpointWriter:
+    """
+    Append-only JSON-lines file of the answers, one line per (project, column), flushed
+    to disk every flush_every answers and when closed.
+    """
+
+    def __init__(self, file_name, flush_every=20):
+        self.flush_every = flush_every
+        self.pending = 0
+        needs_newline = os.path.exists(file_name) and os.path.getsize(file_name) > 0
+        if needs_newline:
+            with open(file_name, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        self.file = open(file_name, 'a', encoding='utf-8')
+        if needs_newline:
+            self.file.write("\n")  # Line cut short by a crash, it is skipped when reading.
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
 
-answers = {}
-for col in text_columns:
-    for row in tqdm(range(df.shape[0])):
-        text = df.loc[row, col]
-        if pd.isna(text) or text.strip() == '':
+    def close(self):
+        self.flush()
+        self.file.close()
+
+def read_checkpoint(file_name):
+    if not os.path.exists(file_name):
+        return
+    with open(file_name, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def completed_inputs(file_name):
+    """
+    Input hash of every (project, column) already answered in the checkpoint file.
+    """
+    return {(record['project'], record['col']): record['input_hash'] for record in read_checkpoint(file_name)}
+
+def join_checkpoint(df, file_name, project_column='file_name'):
+    rows = {project: row for row, project in enumerate(df[project_column])}
+    for record in read_checkpoint(file_name):
+        row = rows.get(record['project'])
+        if row is not None:
+            df.at[row, f"{record['col']}_features"] = record['answer']
+            df.at[row, f"{record['col']}_prompt_tokens"] = record.get('prompt_tokens')
+            df.at[row, f"{record['col']}_completion_tokens"] = record.get('completion_tokens')
+
+def row_job(df, row, col, compact=False, project_column='file_name'):
+    """
+    (key, job) pair of analyze_row for the text of df.loc[row, col], or None if it is empty.
+    """
+    text = df.loc[row, col]
+    if pd.isna(text) or text.strip() == '':
+        return None
+
+    processed_text = preprocess_text(text)
+    quantitative_data = df.loc[row, quantitative_columns].to_dict()
+    quantitative_data = compact_quantitative_data(quantitative_data) if compact else str(quantitative_data)
+    project = df.loc[row, project_column]
+    job_hash = input_hash(processed_text, quantitative_data)
+    return (row, col, project, job_hash), (row, processed_text, quantitative_data)
+
+def analysis_jobs(df, col, done, compact=False, project_column='file_name'):
+    for row in range(df.shape[0]):
+        job = row_job(df, row, col, compact, project_column)
+        if job is None:
+            continue
+        (_, _, project, job_hash), _ = job
+        if done.get((project, col)) == job_hash:
             continue
+        yield job
 
-        processed_text = preprocess_text(text)
-        quantitative_data = df.loc[row, quantitative_columns].to_dict()
-        quantitative_data = str(quantitative_data)
-        qualitative_data = create_features(processed_text, quantitative_data)
+def answer_record(project, col, job_hash, answer, usage):
+    return {
+        'project': project,
+        'col': col,
+        'input_hash': job_hash,
+        'answer': answer,
+        'prompt_tokens': usage.get('prompt_tokens'),
+        'completion_tokens': usage.get('completion_tokens'),
+    }
 
-        try:
-            processed_answers = qualitative_data.split("<ANSWER>")[1].split("</ANSWER>")[0].strip()
-        except IndexError:
-            processed_answers = "Error"
-            print("Error extracting qualitative features for row:", row)
+def main(input_file=PROJECT_DATA_FILE, output_file='df_augmented.csv', max_in_flight=4, client=None,
+         cache_file=LLM_CACHE_FILE, cache_max_entries=None, cache_max_age=None,
+         checkpoint_file='llm_results.jsonl', flush_every=20, compact=False, metrics_file=None, metrics_port=None):
+    """
+    Generate the qualitative features of every project description with the LLM.
+    Up to max_in_flight requests are sent concurrently through client (by default an
+    LLMClient for the local LM Studio server) and each answer is stored in its own (row, col).
+    Answers are cached in cache_file so that a rerun only calls the model for new or
+    changed projects. Pass cache_file=None to always call the model.
+    Every answer is appended to checkpoint_file as soon as it arrives. A restarted run
+    skips the projects already answered for the same input and the checkpoint is joined
+    back into the output at the end.
+    With compact=True the features are asked for with the compact JSON prompt of
+    create_compact_features instead of the HTML template. The prompt and completion
+    tokens of every row are stored next to its answer.
+    Metrics (request latencies, tokens, retries and errors) are written to metrics_file
+    and served on metrics_port when given.
+    """
+    if metrics_file or metrics_port:
+        metrics.enable(metrics_file, metrics_port, flush_interval=60)
+    client = client or LLMClient(max_in_flight=max_in_flight)
+    if cache_file is not None and client.cache is None:
+        client.cache = LLMCache(cache_file, max_entries=cache_max_entries, max_age=cache_max_age)
+    # Only the columns that go into the prompts, and the project key the answers are joined on.
+    df = load_project_data(input_file, columns=['file_name', *text_columns, *quantitative_columns])
 
-        answers[(row, col)] = processed_answers
-        df.at[row, f"{col}_features"] = processed_answers
+    done = completed_inputs(checkpoint_file)
+    checkpoint = CheckpointWriter(checkpoint_file, flush_every)
+    failed = []
+    try:
+        for col in text_columns:
+            results = client.map(lambda job: analyze_row(job, client, compact), analysis_jobs(df, col, done, compact))
+            for (row, col, project, job_hash), result in tqdm(results):
+                if result is None:
+                    # Not answered, retried on the next run.
+                    metrics.incr("llm_rows", status="failed")
+                    failed.append((row, col))
+                    continue
+                processed_answers, usage = result
+                metrics.incr("llm_rows", status="error" if processed_answers == "Error" else "ok")
+                checkpoint.write(answer_record(project, col, job_hash, processed_answers, usage))
+    finally:
+        checkpoint.close()
+
+    join_checkpoint(df, checkpoint_file)
+    for row, col in failed:
+        df.at[row, f"{col}_features"] = "Error"
+
+    df.to_csv(output_file, index=False, sep=';', decimal='.', encoding='utf-8')
+    print(f"Updated DataFrame saved to '{output_file}'.")
+    for col in text_columns:
+        if f"{col}_prompt_tokens" not in df:
+            continue
+        tokens = df[[f"{col}_prompt_tokens", f"{col}_completion_tokens"]].astype(float)
+        print(f"Tokens per row for '{col}': {tokens.mean().round(1).to_dict()}, total {tokens.sum().to_dict()}")
+    if client.cache is not None:
+        print(f"LLM cache: {client.cache.stats()}")
+    metrics.flush()
+    return df
 
-df.to_csv('df_augmented.csv', index=False, sep=';', decimal='.', encoding='utf-8')
-print("Updated DataFrame saved to 'df_augmented.csv'.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import hashlib
+import queue
+import statistics
+import threading
+import time
+import perform_analysis_llm
+from get_data_from_text import extract_text, open_manifest, store_record, run_extraction
+from http_fetcher import fetch_projects
+from llm_cache import LLMCache, LLM_CACHE_FILE
+from llm_client import LLMClient
+from metrics import metrics
+from perform_analysis_llm import (
+    text_columns, row_job, analyze_row, answer_record, completed_inputs, CheckpointWriter,
+)
+from project_data import PROJECT_DATA_FILE, build_typed_frame
+
+
+def extract_worker(page_queue, job_queue, analysis_workers, manifest_path, done, compact, stop, counts, counts_lock):
+    # A single thread is enough: a page is parsed in about a millisecond, far faster
+    # than it is fetched or analysed.
+    conn = open_manifest(manifest_path) if manifest_path else None
+    try:
+        while True:
+            page = page_queue.get()
+            if page is None:
+                break
+            if stop.is_set():
+                continue
+
+            file_path, manifest_key, project_text, fetched_at = page
+            try:
+                record = extract_text(project_text, file_path)
+                if conn is not None:
+                    # The final extraction pass then reads this page from the manifest.
+                    with conn:
+                        if manifest_key == file_path:
+                            store_record(conn, file_path, record)
+                        else:
+                            # Keyed and hashed like the snapshot in the corpus store (see iter_store_records).
+                            data = project_text.encode('utf-8')
+                            store_record(conn, manifest_key, record, stat=(len(data), time.time_ns()),
+                                         file_hash=hashlib.sha256(data).hexdigest())
+                df = build_typed_frame([record])
+                for col in text_columns:
+                    job = row_job(df, 0, col, compact)
+                    if job is None:
+                        continue
+                    (_, _, project, job_hash), _ = job
+                    if done.get((project, col)) == job_hash:
+                        continue
+                    job_queue.put((job, fetched_at))
+                with counts_lock:
+                    counts['extracted'] += 1
+            except Exception as e:
+                print(f"Failed to extract {file_path}: {e}")
+    finally:
+        if conn is not None:
+            conn.close()
+        for _ in range(analysis_workers):
+            job_queue.put(None)
+
+
+def analysis_worker(job_queue, client, compact, checkpoint, stop, latencies, counts, counts_lock):
+    while True:
+        item = job_queue.get()
+        if item is None:
+            break
+        if stop.is_set():
+            continue
+
+        ((row, col, project, job_hash), job), fetched_at = item
+        try:
+            result = analyze_row(job, client, compact)
+        except Exception as e:
+            print(f"Failed to analyse {project}: {e}")
+            result = None
+        if result is None:
+            # Not answered, retried by the final analysis pass or the next run.
+            metrics.incr("llm_rows", status="failed")
+            with counts_lock:
+                counts['failed'] += 1
+            continue
+
+        processed_answers, usage = result
+        metrics.incr("llm_rows", status="error" if processed_answers == "Error" else "ok")
+        latency = time.perf_counter() - fetched_at
+        metrics.observe("project_latency_seconds", latency)
+        with counts_lock:
+            checkpoint.write(answer_record(project, col, job_hash, processed_answers, usage))
+            latencies.append(latency)
+            counts['analysed'] += 1
+
+
+def run_pipeline(session, project_urls, output_dir="project_txt_files", fetch_workers=16, requests_per_second=20,
+                 client=None, max_in_flight=4, compact=False, queue_size=64, crawl_state=None,
+                 manifest_path='extraction_manifest.db', csv_file='project_data.csv', parquet_file=PROJECT_DATA_FILE,
+                 output_file='df_augmented.csv', cache_file=LLM_CACHE_FILE, checkpoint_file='llm_results.jsonl',
+                 flush_every=20, corpus_store=None):
+    """
+    Fetch, extract and analyse the projects as one stream instead of three batch passes.
+
+    Pages are fetched over session by fetch_workers threads and saved to output_dir, or to
+    corpus_store when one is given. Each saved page goes through a bounded queue to the
+    extraction thread, and its LLM jobs through another bounded queue to the analysis threads
+    (one per request in flight), whose answers are appended to checkpoint_file. A project is
+    therefore analysed seconds after its page is fetched, and a full queue blocks the stage
+    feeding it, so a slow stage holds the others back instead of piling up pages in memory.
+
+    On Ctrl-C, no new page is fetched, the requests in flight finish and are checkpointed,
+    and the queued projects are dropped: they are saved and picked up by the next run.
+    Otherwise, csv_file and parquet_file are rebuilt from the extraction manifest
+    and perform_analysis_llm.main joins the checkpoint into output_file, answering any
+    project that was not analysed yet.
+    """
+    client = client or LLMClient(max_in_flight=max_in_flight)
+    if cache_file is not None and client.cache is None:
+        client.cache = LLMCache(cache_file)
+    analysis_workers = client.max_in_flight
+
+    page_queue = queue.Queue(maxsize=queue_size)
+    job_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    done = completed_inputs(checkpoint_file)
+    checkpoint = CheckpointWriter(checkpoint_file, flush_every)
+    counts = {'fetched': 0, 'extracted': 0, 'analysed': 0, 'failed': 0}
+    counts_lock = threading.Lock()
+    latencies = []
+
+    def on_fetched(url, file_path, project_text):
+        if corpus_store is not None:
+            project_id = url.split('-')[-1]
+            page = (f"project_{project_id}.txt", f"{corpus_store.pack_file}:{project_id}")
+        else:
+            page = (file_path, file_path)
+        page_queue.put((*page, project_text, time.perf_counter()))
+
+    def fetch():
+        try:
+            counts['fetched'] = fetch_projects(
+                session, project_urls, output_dir, workers=fetch_workers, requests_per_second=requests_per_second,
+                crawl_state=crawl_state, skip_existing=False, on_fetched=on_fetched, stop=stop,
+                corpus_store=corpus_store,
+            )
+        finally:
+            page_queue.put(None)
+
+    threads = [
+        threading.Thread(target=fetch, daemon=True),
+        threading.Thread(
+            target=extract_worker,
+            args=(page_queue, job_queue, analysis_workers, manifest_path, done, compact, stop, counts, counts_lock),
+            daemon=True,
+        ),
+    ] + [
+        threading.Thread(
+            target=analysis_worker,
+            args=(job_queue, client, compact, checkpoint, stop, latencies, counts, counts_lock),
+            daemon=True,
+        )
+        for _ in range(analysis_workers)
+    ]
+
+    start = time.monotonic()
+    try:
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                # Joined with a timeout so that Ctrl-C reaches the main thread.
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            print("Stopping: waiting for the requests in flight, queued projects are left for the next run...")
+            stop.set()
+            for thread in threads:
+                thread.join()
+    finally:
+        checkpoint.close()
+    elapsed = time.monotonic() - start
+
+    print(f"Pipeline: {counts['fetched']} fetched, {counts['extracted']} extracted, {counts['analysed']} analysed "
+          f"({counts['failed']} failed) in {elapsed:.1f}s")
+    if latencies:
+        print(f"Fetch to answer latency: median {statistics.median(latencies):.2f}s, max {max(latencies):.2f}s")
+    if stop.is_set():
+        return None
+
+    run_extraction(manifest_path=manifest_path, parquet_file=parquet_file, folder_txt=output_dir, file_name=csv_file,
+                   corpus_store=corpus_store)
+    return perform_analysis_llm.main(input_file=parquet_file, output_file=output_file, client=client,
+                                     cache_file=cache_file, checkpoint_file=checkpoint_file,
+                                     flush_every=flush_every, compact=compact)
@@ -0,0 +1,89 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+PROJECT_DATA_FILE = 'project_data.parquet'
+
+# Typed schema of the extracted project data, in column order. Durations are
+# normalised to months ('Durée (value)') and minutes ('Durée de financement (value)')
+# and missing values are nulls instead of the 'N/A' / 'NC' / -1 sentinels of the csv.
+PROJECT_DATA_SCHEMA = {
+    "Project Name": "string",
+    "Category of Activity": "string",
+    "City": "string",
+    "Department": "category",
+    "Project Description": "string",
+    "Montant Levé": "Float64",
+    "Montant Demandé": "Float64",
+    "Taux d’intérêt annuel": "Float64",
+    "Niveau de risque": "category",
+    "Durée (value)": "Int64",
+    "Durée de financement (value)": "Float64",
+    "Chiffre d'affaires (year)": "Int64",
+    "Chiffre d'affaires (value)": "Float64",
+    "Date de création": "Int64",
+    "Nombre de salariés": "Int64",
+    "Nombre de preteurs": "Int64",
+    "Entreprise": "string",
+    "A propos": "string",
+    "file_name": "string",
+}
+
+DURATION_MONTHS = {"mois": 1, "ans": 12}
+FUNDING_TIME_MINUTES = {"minutes": 1, "heures": 60, "jours": 24 * 60}
+
+
+def build_typed_frame(records):
+    """
+    Build a DataFrame following PROJECT_DATA_SCHEMA from the records of get_data_from_text.extract_file.
+    """
+    df = pd.DataFrame.from_records(records, columns=list(PROJECT_DATA_SCHEMA) + [
+        "Durée (unit)", "Durée de financement (unit)"])
+
+    for column, dtype in PROJECT_DATA_SCHEMA.items():
+        if dtype in ("Int64", "Float64"):
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+
+    df["Durée (value)"] *= df["Durée (unit)"].map(DURATION_MONTHS)
+    df["Durée de financement (value)"] *= df["Durée de financement (unit)"].map(FUNDING_TIME_MINUTES)
+
+    df = df[list(PROJECT_DATA_SCHEMA)]
+    for column, dtype in PROJECT_DATA_SCHEMA.items():
+        if dtype == "Int64":
+            df[column] = df[column].round().astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def project_data_arrow_schema():
+    schema = pa.Schema.from_pandas(build_typed_frame([]), preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            # Fixed index width so that chunks with different numbers of categories share one schema.
+            schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), pa.string())))
+    return schema
+
+
+def open_project_data_writer(file_name=PROJECT_DATA_FILE):
+    return pq.ParquetWriter(file_name, project_data_arrow_schema(), compression='zstd')
+
+
+def write_project_data_chunk(writer, df):
+    writer.write_table(pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False))
+
+
+def save_project_data(df, file_name=PROJECT_DATA_FILE):
+    with open_project_data_writer(file_name) as writer:
+        write_project_data_chunk(writer, df)
+
+
+def load_project_data(file_name=PROJECT_DATA_FILE, columns=None):
+    """
+    Load the project data, reading only the requested columns.
+    Parquet files come back with the schema dtypes, legacy csv files are parsed as before.
+    """
+    if file_name.endswith('.parquet'):
+        return pd.read_parquet(file_name, columns=columns)
+    return pd.read_csv(file_name, sep=';', encoding='utf-8', on_bad_lines='skip', usecols=columns)
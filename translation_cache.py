@@ -0,0 +1,90 @@
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+
+
+TRANSLATION_CACHE_FILE = 'translation_cache.db'
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_chunk(chunk):
+    return WHITESPACE_PATTERN.sub(' ', unicodedata.normalize('NFC', chunk)).strip()
+
+
+def chunk_key(model, chunk):
+    return hashlib.sha256(f"{model}\n{normalize_chunk(chunk)}".encode('utf-8')).hexdigest()
+
+
+class TranslationCache:
+    """
+    Translations of text chunks stored in SQLite, keyed by the hash of the model and the
+    chunk with its whitespace normalized. Past max_entries, the least recently used
+    translations are evicted. hits and misses count the chunks looked up by this process.
+    """
+
+    def __init__(self, file_name=TRANSLATION_CACHE_FILE, max_entries=None):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(file_name, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    key TEXT PRIMARY KEY,
+                    translation TEXT,
+                    last_used REAL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, model, chunks):
+        """
+        Cached translations of the given chunks, as a dict from chunk to translation.
+        """
+        keys = {chunk: chunk_key(model, chunk) for chunk in chunks}
+        found = {}
+        with self.lock, self.conn:
+            unique_keys = list(set(keys.values()))
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                found.update(self.conn.execute(
+                    f"SELECT key, translation FROM translations WHERE key IN ({','.join('?' * len(batch))})", batch
+                ))
+            self.conn.executemany("UPDATE translations SET last_used = ? WHERE key = ?",
+                                  [(time.time(), key) for key in found])
+        translations = {chunk: found[key] for chunk, key in keys.items() if key in found}
+        self.hits += sum(1 for chunk in chunks if chunk in translations)
+        self.misses += sum(1 for chunk in chunks if chunk not in translations)
+        return translations
+
+    def put_many(self, model, translations):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, translation, last_used) VALUES (?, ?, ?)",
+                [(chunk_key(model, chunk), translation, now) for chunk, translation in translations.items()],
+            )
+            if self.max_entries is not None:
+                self.conn.execute(
+                    "DELETE FROM translations WHERE key NOT IN "
+                    "(SELECT key FROM translations ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+
+    def stats(self):
+        with self.lock:
+            entries, = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+        }